@@ -0,0 +1,89 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+from .lru import LRUCache
+
+TOKEN_FIELDS = tuple(field.attname for field in Token._meta.concrete_fields)
+# Хэш пароля не попадает ни в память процесса, ни в общий кэш: поле
+# остаётся отложенным и загружается из базы при обращении к нему.
+USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname != 'password'
+)
+
+# Храним значения полей, а не сами экземпляры: каждый запрос получает свои
+# объекты User и Token, которые можно менять, не затрагивая другие потоки.
+TokenRow = namedtuple('TokenRow', 'token user')
+
+
+class TokenUserCache:
+    def __init__(self, max_entries, ttl, shared_cache=None,
+                 key_prefix='auth:token'):
+        self.ttl = ttl
+        self.shared_cache = caches[shared_cache] if shared_cache else None
+        self.key_prefix = key_prefix
+        self._entries = LRUCache(max_entries, ttl)
+
+    def get(self, key, load):
+        row = self._entries.get(key)
+        if row is not None:
+            return row
+        checkpoint = self._entries.checkpoint()
+        row = None
+        if self.shared_cache is not None:
+            row = self.shared_cache.get(self._shared_key(key))
+        if row is None:
+            row = load(key)
+            if self.shared_cache is not None:
+                self.shared_cache.set(self._shared_key(key), row, self.ttl)
+        self._entries.set(key, row, checkpoint=checkpoint)
+        return row
+
+    def invalidate(self, key):
+        self._entries.pop(key)
+        if self.shared_cache is not None:
+            self.shared_cache.delete(self._shared_key(key))
+
+    def invalidate_user(self, user_id):
+        for key in Token.objects.filter(
+                user_id=user_id).values_list('key', flat=True):
+            self.invalidate(key)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _shared_key(self, key):
+        return f'{self.key_prefix}:{key}'
+
+
+token_user_cache = TokenUserCache(
+    settings.TOKEN_AUTH_CACHE['MAX_ENTRIES'],
+    settings.TOKEN_AUTH_CACHE['TTL'],
+    settings.TOKEN_AUTH_CACHE['SHARED_CACHE']
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+
+    def authenticate_credentials(self, key):
+        row = token_user_cache.get(key, self._load)
+        user = User.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, row.user)
+        token = Token.from_db(DEFAULT_DB_ALIAS, TOKEN_FIELDS, row.token)
+        token.user = user
+        return user, token
+
+    def _load(self, key):
+        # Неверные токены и неактивных пользователей не кэшируем:
+        # родительский метод для них бросает AuthenticationFailed.
+        user, token = super().authenticate_credentials(key)
+        return TokenRow(
+            tuple(getattr(token, field) for field in TOKEN_FIELDS),
+            tuple(getattr(user, field) for field in USER_FIELDS)
+        )
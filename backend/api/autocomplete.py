@@ -0,0 +1,57 @@
+from bisect import bisect_left
+from itertools import chain
+from threading import Lock
+
+from recipes.catalog import get_catalog_version
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    # Версия, ключи и ингредиенты публикуются одним присваиванием
+    # неизменяемого кортежа: поиск без блокировки видит либо старый индекс,
+    # либо новый, но не ключи одного и ингредиенты другого.
+    def __init__(self):
+        self._lock = Lock()
+        self._index = (None, (), ())
+
+    def _get_index(self):
+        version = get_catalog_version()
+        index = self._index
+        if version == index[0]:
+            return index
+        with self._lock:
+            index = self._index
+            if version == index[0]:
+                return index
+            ingredients = tuple(sorted(
+                Ingredient.objects.values('id', 'name', 'measurement_unit'),
+                key=lambda ingredient: (
+                    ingredient['name'].casefold(), ingredient['id'])
+            ))
+            index = (
+                version,
+                tuple(
+                    ingredient['name'].casefold()
+                    for ingredient in ingredients),
+                ingredients
+            )
+            self._index = index
+            return index
+
+    def search(self, query, limit):
+        _, keys, ingredients = self._get_index()
+        query = query.strip().casefold()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\U0010ffff', start)
+        results = list(ingredients[start:min(end, start + limit)])
+        if not query:
+            return results
+        for position in chain(range(start), range(end, len(keys))):
+            if len(results) >= limit:
+                break
+            if query in keys[position]:
+                results.append(ingredients[position])
+        return results
+
+
+ingredient_index = IngredientIndex()
@@ -1,10 +1,13 @@
 from django_filters.rest_framework import FilterSet, filters
 
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.search import search_recipes
+
+from .membership import get_user_recipes
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='startswith')
+    name = filters.CharFilter(lookup_expr='istartswith')
 
     class Meta:
         model = Ingredient
@@ -16,8 +19,10 @@ class RecipeFilter(FilterSet):
         field_name='tags__slug',
         to_field_name='slug',
         queryset=Tag.objects.all(),
+        method='filter_tags',
     )
 
+    search = filters.CharFilter(method='filter_search')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
@@ -26,14 +31,25 @@ class RecipeFilter(FilterSet):
         model = Recipe
         fields = ('tags', 'author',)
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        return queryset.filter(id__in=Recipe.tags.through.objects.filter(
+            tag__in=value).values('recipe_id'))
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        user_id = self.request.user.id
-        if value and user_id:
-            return queryset.filter(shopping_cart__user_id=user_id)
+        user = self.request.user
+        if value and user.is_authenticated:
+            return queryset.filter(
+                id__in=list(get_user_recipes(user).shopping_cart))
         return queryset
 
     def filter_is_favorited(self, queryset, name, value):
-        user_id = self.request.user.id
-        if value and user_id:
-            return queryset.filter(favorite__user_id=user_id)
+        user = self.request.user
+        if value and user.is_authenticated:
+            return queryset.filter(
+                id__in=list(get_user_recipes(user).favorites))
         return queryset
@@ -0,0 +1,69 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+
+class LRUCache:
+    # Потокобезопасный кэш в памяти процесса: при переполнении вытесняются
+    # записи, которые дольше всего не читали. Записи живут не дольше ttl
+    # секунд и принадлежат одной версии данных: запись с новой версией
+    # сбрасывает все предыдущие.
+    def __init__(self, max_entries, ttl=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = Lock()
+        self._entries = OrderedDict()
+        self._version = None
+        self._invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, version=None):
+        with self._lock:
+            if version != self._version:
+                return None
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires is not None and expires <= monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def checkpoint(self):
+        # Значение, загруженное после checkpoint(), не сохранится, если
+        # до вызова set() запись сбросили: иначе в кэш попали бы данные,
+        # прочитанные до изменения.
+        with self._lock:
+            return self._invalidations
+
+    def set(self, key, value, version=None, checkpoint=None):
+        expires = None if self.ttl is None else monotonic() + self.ttl
+        with self._lock:
+            if checkpoint is not None and checkpoint != self._invalidations:
+                return 0
+            evicted = 0
+            if version != self._version:
+                evicted = len(self._entries)
+                self._entries.clear()
+                self._version = version
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def pop(self, key):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._entries.clear()
+            self._version = None
@@ -0,0 +1,262 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from statistics import quantiles
+
+import requests
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from api.management.dataset import (SEED_IMAGE, SEED_PREFIX,
+                                    delete_seed_dataset, get_dataset_context,
+                                    seed_dataset)
+from recipes.images import iter_variant_names
+from recipes.models import Recipe, Tag
+
+SERVERS = (
+    # Как в Dockerfile: gunicorn с одним синхронным воркером по умолчанию.
+    ('WSGI', ('backend.wsgi',)),
+    ('ASGI', (
+        'backend.asgi:application',
+        '--worker-class', 'uvicorn.workers.UvicornWorker',
+    )),
+)
+PATHS = (
+    '/api/recipes/?limit=6',
+    '/api/recipes/?limit=6&tags={tag_slug}',
+    '/api/recipes/?limit=6&search={search}',
+    '/api/recipes/{recipe}/',
+    '/api/tags/',
+    '/api/ingredients/?name={prefix}',
+)
+DOWNLOAD_PATH = '/api/recipes/download_shopping_cart/'
+UPLOAD_PATH = '/api/recipes/'
+UPLOAD_CHUNKS = 20
+STARTUP_TIMEOUT = 30
+
+
+class TrickleBody:
+    # Тело запроса с заранее известной длиной, которое отправляется
+    # по частям, как загрузка фотографии по медленной мобильной сети.
+    def __init__(self, content, seconds):
+        self.content = content
+        self.delay = seconds / UPLOAD_CHUNKS
+
+    def __len__(self):
+        return len(self.content)
+
+    def __iter__(self):
+        size = -(-len(self.content) // UPLOAD_CHUNKS)
+        for start in range(0, len(self.content), size):
+            time.sleep(self.delay)
+            yield self.content[start:start + size]
+
+
+def get_upload_payload(context):
+    buffer = BytesIO()
+    Image.new('RGB', (640, 480), '#E26C2D').save(buffer, 'PNG')
+    return json.dumps({
+        'name': f'{SEED_PREFIX} загруженный рецепт',
+        'text': 'Описание рецепта.',
+        'cooking_time': 30,
+        'tags': [context['tag']],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 100}
+            for ingredient in context['ingredients'][:3]
+        ],
+        'image': 'data:image/png;base64,'
+        + b64encode(buffer.getvalue()).decode(),
+    }).encode()
+
+
+class Command(BaseCommand):
+    help = ('Сравниваем пропускную способность и задержки чтения API под '
+            'WSGI и ASGI, пока другие клиенты скачивают список покупок и '
+            'медленно загружают фотографии рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=800)
+        parser.add_argument('--download-clients', type=int, default=1)
+        parser.add_argument('--upload-clients', type=int, default=2)
+        parser.add_argument(
+            '--upload-seconds', type=float, default=1.0,
+            help='За сколько секунд клиент отправляет тело загрузки.'
+        )
+
+    def handle(self, *args, **options):
+        # Серверы работают в отдельных процессах и не видят данные
+        # незавершённой транзакции, поэтому тестовый набор сохраняется
+        # в базе и удаляется после замера.
+        if Tag.objects.filter(slug__startswith='seed-').exists():
+            raise CommandError(
+                'В базе уже есть тестовые данные, удалите их перед замером')
+        try:
+            dataset = seed_dataset(
+                users=50, recipes=1000, ingredients=2000, tags=10,
+                ingredients_per_recipe=(5, 15), cart_per_user=200)
+            context = get_dataset_context(dataset)
+            token, _ = Token.objects.get_or_create(user=context['user'])
+            context['token'] = token.key
+            context['upload'] = get_upload_payload(context)
+            results = {
+                name: self.benchmark(arguments, context, options)
+                for name, arguments in SERVERS
+            }
+        finally:
+            self.delete_uploaded_images()
+            delete_seed_dataset()
+        baseline = results['WSGI']['throughput']
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name}: {result["throughput"]:.1f} запросов/с, '
+                f'p50 {result["p50"]:.1f} мс, p95 {result["p95"]:.1f} мс, '
+                f'списков покупок {result["downloads"]}, '
+                f'загрузок {result["uploads"]} '
+                f'(ошибок {result["upload_errors"]}), '
+                f'ускорение x{result["throughput"] / baseline:.1f}'
+            )
+
+    def benchmark(self, arguments, context, options):
+        port = self.get_free_port()
+        url = f'http://127.0.0.1:{port}'
+        server = subprocess.Popen(
+            (sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+             *arguments),
+            cwd=settings.BASE_DIR, env=os.environ.copy(),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            self.wait_for_server(server, url)
+            return self.run_load(url, context, options)
+        finally:
+            server.terminate()
+            server.wait()
+
+    def delete_uploaded_images(self):
+        recipes = Recipe.objects.filter(
+            author__username__startswith=f'{SEED_PREFIX}-user-'
+        ).exclude(image=SEED_IMAGE)
+        storage = Recipe._meta.get_field('image').storage
+        for recipe in recipes.only('image', 'image_variants'):
+            for name in (
+                recipe.image.name, *iter_variant_names(recipe.image_variants)
+            ):
+                storage.delete(name)
+
+    def get_free_port(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            return sock.getsockname()[1]
+
+    def wait_for_server(self, server, url):
+        deadline = time.monotonic() + STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Сервер {url} завершился при запуске')
+            try:
+                requests.get(f'{url}/api/tags/', timeout=1)
+                return
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        raise CommandError(f'Сервер {url} не запустился')
+
+    def run_load(self, url, context, options):
+        paths = [f'{url}{path.format(**context)}' for path in PATHS]
+        headers = {'Authorization': f'Token {context["token"]}'}
+        finished = False
+
+        def check(response):
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{response.url}: {response.status_code}')
+
+        def get(session, path):
+            check(session.get(path, headers=headers))
+
+        def download_client():
+            count = 0
+            with requests.Session() as session:
+                while not finished:
+                    get(session, f'{url}{DOWNLOAD_PATH}')
+                    count += 1
+            return count
+
+        def upload_client():
+            count = errors = 0
+            with requests.Session() as session:
+                while not finished:
+                    # В SQLite параллельные записи иногда падают с
+                    # «database is locked», такие загрузки считаем отдельно.
+                    response = session.post(
+                        f'{url}{UPLOAD_PATH}',
+                        data=TrickleBody(
+                            context['upload'], options['upload_seconds']),
+                        headers={
+                            **headers, 'Content-Type': 'application/json'}
+                    )
+                    if response.status_code == 201:
+                        count += 1
+                    else:
+                        errors += 1
+            return count, errors
+
+        def client(numbers):
+            latencies = []
+            with requests.Session() as session:
+                for number in numbers:
+                    started = time.perf_counter()
+                    get(session, paths[number % len(paths)])
+                    latencies.append(time.perf_counter() - started)
+            return latencies
+
+        with ThreadPoolExecutor(
+            options['concurrency'] + options['download_clients']
+            + options['upload_clients']
+        ) as executor:
+            downloads = [
+                executor.submit(download_client)
+                for _ in range(options['download_clients'])
+            ]
+            uploads = [
+                executor.submit(upload_client)
+                for _ in range(options['upload_clients'])
+            ]
+            started = time.perf_counter()
+            # Фоновые клиенты останавливаются и при ошибке замера, иначе
+            # выход из пула ждал бы их бесконечно.
+            try:
+                latencies = [
+                    latency
+                    for latencies in executor.map(client, (
+                        range(number, options['requests'],
+                              options['concurrency'])
+                        for number in range(options['concurrency'])
+                    ))
+                    for latency in latencies
+                ]
+            finally:
+                finished = True
+            elapsed = time.perf_counter() - started
+            downloads = sum(future.result() for future in downloads)
+            uploads, upload_errors = (
+                sum(counts) for counts in zip(
+                    (0, 0), *(future.result() for future in uploads))
+            )
+        percentiles = quantiles(latencies, n=100)
+        return {
+            'throughput': len(latencies) / elapsed,
+            'p50': percentiles[49] * 1000,
+            'p95': percentiles[94] * 1000,
+            'downloads': downloads,
+            'uploads': uploads,
+            'upload_errors': upload_errors,
+        }
@@ -0,0 +1,83 @@
+import json
+from timeit import timeit
+
+import msgpack
+import orjson
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.management.commands.check_query_budget import BUDGETS, LARGE_LIMIT
+from api.management.dataset import get_dataset_context, seeded_dataset
+from api.renderers import MessagePackRenderer, ORJSONRenderer
+
+PAGE_SIZE = 100
+RENDERERS = (
+    ('JSONRenderer', JSONRenderer()),
+    ('ORJSONRenderer', ORJSONRenderer()),
+    ('MessagePackRenderer', MessagePackRenderer()),
+)
+
+
+class Command(BaseCommand):
+    help = ('Сравниваем ORJSONRenderer со стандартным JSONRenderer на всех '
+            'GET-эндпоинтах и замеряем скорость рендеринга страницы '
+            'рецептов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100)
+
+    def handle(self, *args, **options):
+        with seeded_dataset(recipes=PAGE_SIZE + 20) as dataset:
+            context = get_dataset_context(dataset)
+            client = APIClient()
+            token, _ = Token.objects.get_or_create(user=context['user'])
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            mismatches = [
+                budget.name for budget in BUDGETS
+                if budget.method == 'get' and budget.user == 'user'
+                and not self.renders_identically(
+                    client, budget.path.format(limit=LARGE_LIMIT, **context))
+            ]
+            page = self.get_data(
+                client, f'/api/recipes/?limit={PAGE_SIZE}')
+        if mismatches:
+            raise CommandError(
+                'ORJSONRenderer отличается от JSONRenderer:\n'
+                + '\n'.join(mismatches))
+        self.stdout.write('Ответы ORJSONRenderer совпадают с JSONRenderer')
+        self.benchmark(page, options['iterations'])
+
+    def get_data(self, client, path):
+        response = client.get(path, HTTP_ACCEPT='application/json')
+        if response.status_code >= 400:
+            raise CommandError(f'{path}: {response.status_code}')
+        if getattr(response, 'streaming', False):
+            return None
+        # Закэшированные ответы справочников приходят уже готовыми байтами.
+        if hasattr(response, 'data'):
+            return response.data
+        return orjson.loads(response.content)
+
+    def renders_identically(self, client, path):
+        data = self.get_data(client, path)
+        if data is None:
+            return True
+        expected = JSONRenderer().render(data)
+        return (
+            ORJSONRenderer().render(data) == expected
+            and msgpack.unpackb(MessagePackRenderer().render(data))
+            == json.loads(expected)
+        )
+
+    def benchmark(self, page, iterations):
+        baseline = None
+        for name, renderer in RENDERERS:
+            seconds = timeit(lambda: renderer.render(page), number=iterations)
+            baseline = baseline or seconds
+            self.stdout.write(
+                f'{name}: {seconds / iterations * 1000:.2f} мс на страницу '
+                f'из {PAGE_SIZE} рецептов, {len(renderer.render(page))} '
+                f'байт, ускорение x{baseline / seconds:.1f}'
+            )
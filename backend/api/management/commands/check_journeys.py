@@ -0,0 +1,62 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from api.management.commands.load_test import Recorder, TestClientSession
+from api.management.dataset import seeded_dataset
+from api.management.journeys import JOURNEYS, VirtualUser
+
+# Списки, с которых начинаются сценарии: без них продолжать нечем.
+FAILING_PATHS = ('/api/recipes/', '/api/users/subscriptions/')
+
+
+class FailingSession(TestClientSession):
+    def request(self, name, method, path, params=None, expected=200):
+        if method == 'get' and path in FAILING_PATHS:
+            return self.finish(
+                name, time.perf_counter(), 500, expected, b'')
+        return super().request(name, method, path, params, expected)
+
+
+class Command(BaseCommand):
+    help = ('Проверяем, что сценарии нагрузочного теста записывают ошибку '
+            'списка и не прерывают прогон')
+
+    def handle(self, *args, **options):
+        with seeded_dataset(users=2, recipes=20, ingredients=20) as dataset:
+            user = dataset.recipes[0].author
+            token, _ = Token.objects.get_or_create(user=user)
+            recorder = Recorder()
+            visitor = VirtualUser(FailingSession(recorder, token.key), user)
+            context = {
+                'tag_slugs': [tag.slug for tag in dataset.tags],
+                'ingredient_names': [
+                    ingredient.name for ingredient in dataset.ingredients],
+                'recipe_ids': [recipe.id for recipe in dataset.recipes],
+            }
+            failures = []
+            for journey, _, _ in JOURNEYS:
+                try:
+                    journey(visitor, context, random.Random(0))
+                except Exception as error:
+                    failures.append(f'{journey.__name__}: {error!r}')
+        unexpected = {
+            name: errors for name, errors in recorder.errors.items()
+            if errors != ['500'] * len(errors)
+        }
+        if unexpected:
+            failures += [
+                f'{name}: ответы {", ".join(errors)}'
+                for name, errors in unexpected.items()
+            ]
+        if not recorder.errors:
+            failures.append('ошибки списков не записаны')
+        if failures:
+            raise CommandError(
+                'Сценарии не обработали ошибку списка:\n'
+                + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS(
+            'Сценарии записывают ошибки списков: '
+            + ', '.join(sorted(recorder.errors))))
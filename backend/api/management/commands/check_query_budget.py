@@ -0,0 +1,439 @@
+from collections import namedtuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import default_token_generator
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import get_resolver, resolve
+from djoser.utils import encode_uid
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import CachedTokenAuthentication
+from api.management.dataset import (SEED_IMAGE, SEED_PREFIX,
+                                    get_dataset_context, seeded_dataset)
+from api.membership import user_recipes_cache
+from api.nplusone import QueryDetector, format_finding, track_queries
+from api.response_cache import recipe_response_cache
+from recipes.counters import recount_counters
+from recipes.models import Favorite, Recipe, RecipeIngredient
+from recipes.search import update_search_index
+from users.models import User
+
+Budget = namedtuple(
+    'Budget',
+    'name method path max_queries anonymous data scales user status',
+    defaults=(False, None, False, 'user', None)
+)
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+
+SMALL_LIMIT = 1
+LARGE_LIMIT = 50
+WALK_LIMIT = 10
+
+PASSWORD = 'Проверочный-пароль-42'
+NEW_PASSWORD = 'Новый-проверочный-пароль-42'
+# Отдельные учётные записи для эндпоинтов, которые меняют или удаляют
+# пользователя, чтобы не зависеть от порядка проверок.
+ACCOUNTS = (
+    'admin', 'inactive_user', 'login_user', 'logout_user', 'password_user',
+    'email_user', 'reset_user', 'deleted_user', 'deleted_me_user',
+    'deleted_author',
+)
+# Столько рецептов получает deleted_author: удаление автора не должно
+# выполнять запросы на каждый рецепт.
+AUTHOR_RECIPES = 45
+
+
+def recipe_data(context):
+    return {
+        'name': 'Проверочный рецепт',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': IMAGE,
+        'tags': [tag.id for tag in context['tags']],
+        'ingredients': [
+            {'id': ingredient.id, 'amount': 10}
+            for ingredient in context['ingredients'][:5]
+        ],
+    }
+
+
+def bulk_recipes_data(context):
+    return {
+        'recipes': [recipe.id for recipe in context['recipes']][
+            :context['limit']]
+    }
+
+
+def new_user_data(context):
+    return {
+        'email': f'{SEED_PREFIX}-new-user@foodgram.example.org',
+        'username': f'{SEED_PREFIX}-new-user',
+        'first_name': 'Имя',
+        'last_name': 'Фамилия',
+        'password': PASSWORD,
+    }
+
+
+def unknown_email_data(context):
+    return {'email': f'{SEED_PREFIX}-unknown@foodgram.example.org'}
+
+
+def account_data(name, **data):
+    def get_data(context):
+        return {'email': context[name].email, **data}
+    return get_data
+
+
+def confirmation_data(name, **data):
+    def get_data(context):
+        # Токен зависит от почты и пароля, которые могли поменять
+        # предыдущие проверки.
+        user = User.objects.get(pk=context[name].pk)
+        return {
+            'uid': encode_uid(user.pk),
+            'token': default_token_generator.make_token(user),
+            **data
+        }
+    return get_data
+
+
+def password_data(**data):
+    def get_data(context):
+        return {'current_password': PASSWORD, **data}
+    return get_data
+
+
+BUDGETS = (
+    Budget('api root', 'get', '/api/', 0, anonymous=True),
+    Budget('metrics', 'get', '/api/metrics/', 0, user='admin'),
+    Budget('cache stats', 'get', '/api/recipes/cache-stats/', 0,
+           user='admin'),
+    Budget('recipes list (anonymous)', 'get',
+           '/api/recipes/?limit={limit}', 5, anonymous=True),
+    Budget('recipes list', 'get', '/api/recipes/?limit={limit}', 5),
+    Budget('recipes list (cursor)', 'get',
+           '/api/recipes/?limit={limit}&cursor=', 4),
+    Budget('recipes list filtered', 'get',
+           '/api/recipes/?limit={limit}&tags={tag_slug}&is_favorited=1'
+           '&is_in_shopping_cart=0', 6),
+    Budget('recipes list (card fields)', 'get',
+           '/api/recipes/?limit={limit}&fields=id,name,image,cooking_time',
+           2),
+    Budget('recipes detail (omit)', 'get',
+           '/api/recipes/{recipe}/?omit=tags,ingredients,author', 2),
+    Budget('recipes search', 'get',
+           '/api/recipes/?limit={limit}&search={search}', 5),
+    Budget('recipes search (cursor)', 'get',
+           '/api/recipes/?limit={limit}&search={search_word}&cursor=', 4),
+    Budget('recipes detail', 'get', '/api/recipes/{recipe}/', 4),
+    Budget('recipes create', 'post', '/api/recipes/', 18, data=recipe_data),
+    Budget('recipes update', 'patch', '/api/recipes/{own_recipe}/', 22,
+           data=recipe_data),
+    Budget('recipes replace', 'put', '/api/recipes/{own_recipe}/', 22,
+           data=recipe_data),
+    Budget('recipes delete', 'delete', '/api/recipes/{deleted_recipe}/', 9),
+    Budget('favorite', 'post', '/api/recipes/{new_recipe}/favorite/', 8),
+    Budget('favorite delete', 'delete',
+           '/api/recipes/{new_recipe}/favorite/', 4),
+    Budget('shopping_cart', 'post',
+           '/api/recipes/{new_recipe}/shopping_cart/', 8),
+    Budget('shopping_cart delete', 'delete',
+           '/api/recipes/{new_recipe}/shopping_cart/', 4),
+    Budget('favorite bulk', 'post', '/api/recipes/favorite/', 6,
+           data=bulk_recipes_data, scales=True),
+    Budget('favorite bulk delete', 'delete', '/api/recipes/favorite/', 6,
+           data=bulk_recipes_data, scales=True),
+    Budget('shopping_cart bulk', 'post', '/api/recipes/shopping_cart/', 6,
+           data=bulk_recipes_data, scales=True),
+    Budget('shopping_cart bulk delete', 'delete',
+           '/api/recipes/shopping_cart/', 6,
+           data=bulk_recipes_data, scales=True),
+    Budget('download_shopping_cart', 'get',
+           '/api/recipes/download_shopping_cart/', 1),
+    Budget('users list', 'get', '/api/users/?limit={limit}', 2),
+    Budget('users list (fields)', 'get',
+           '/api/users/?limit={limit}&fields=id,username', 2),
+    Budget('users detail', 'get', '/api/users/{author}/', 1),
+    Budget('users me', 'get', '/api/users/me/', 1),
+    Budget('users create', 'post', '/api/users/', 5, anonymous=True,
+           data=new_user_data),
+    Budget('set_email', 'post', '/api/users/set_email/', 3,
+           user='email_user',
+           data=password_data(
+               new_email=f'{SEED_PREFIX}-changed@foodgram.example.org')),
+    Budget('set_password', 'post', '/api/users/set_password/', 2,
+           user='password_user', data=password_data(
+               new_password=NEW_PASSWORD)),
+    Budget('activation', 'post', '/api/users/activation/', 2,
+           anonymous=True, data=confirmation_data('inactive_user')),
+    Budget('resend_activation', 'post', '/api/users/resend_activation/', 1,
+           anonymous=True, data=account_data('login_user'), status=400),
+    # Отправка писем djoser в проекте не настроена, поэтому сброс пароля
+    # и почты проверяется для незарегистрированного адреса.
+    Budget('reset_password', 'post', '/api/users/reset_password/', 1,
+           anonymous=True, data=unknown_email_data),
+    Budget('reset_password_confirm', 'post',
+           '/api/users/reset_password_confirm/', 2, anonymous=True,
+           data=confirmation_data('reset_user', new_password=NEW_PASSWORD)),
+    Budget('reset_email', 'post', '/api/users/reset_email/', 1,
+           anonymous=True, data=unknown_email_data),
+    Budget('reset_email_confirm', 'post', '/api/users/reset_email_confirm/',
+           3, anonymous=True, data=confirmation_data(
+               'email_user',
+               new_email=f'{SEED_PREFIX}-reset@foodgram.example.org')),
+    Budget('token login', 'post', '/api/auth/token/login/', 6,
+           anonymous=True,
+           data=account_data('login_user', password=PASSWORD)),
+    Budget('token logout', 'post', '/api/auth/token/logout/', 2,
+           user='logout_user'),
+    Budget('subscriptions', 'get',
+           '/api/users/subscriptions/?limit={limit}&recipes_limit=3', 3),
+    Budget('subscriptions (omit recipes)', 'get',
+           '/api/users/subscriptions/?limit={limit}&omit=recipes', 2),
+    Budget('subscriptions (cursor)', 'get',
+           '/api/users/subscriptions/?limit={limit}&recipes_limit=3&cursor=',
+           2),
+    Budget('subscribe', 'post', '/api/users/{new_author}/subscribe/', 10),
+    Budget('subscribe delete', 'delete',
+           '/api/users/{new_author}/subscribe/', 3),
+    Budget('tags list', 'get', '/api/tags/', 2, anonymous=True),
+    Budget('tags detail', 'get', '/api/tags/{tag}/', 2, anonymous=True),
+    Budget('ingredients list', 'get', '/api/ingredients/?name={prefix}', 2,
+           anonymous=True),
+    Budget('ingredients autocomplete', 'get',
+           '/api/ingredients/autocomplete/?name={prefix}', 3,
+           anonymous=True),
+    Budget('ingredients detail', 'get', '/api/ingredients/{ingredient}/', 2,
+           anonymous=True),
+    # Удаление пользователей каскадом удаляет рецепты из набора данных,
+    # поэтому оно проверяется последним.
+    Budget('users delete', 'delete', '/api/users/{deleted_user.id}/', 16,
+           user='deleted_user', data=password_data()),
+    Budget('users me delete', 'delete', '/api/users/me/', 15,
+           user='deleted_me_user', data=password_data()),
+    Budget('users delete (author)', 'delete',
+           '/api/users/{deleted_author.id}/', 24,
+           user='deleted_author', data=password_data()),
+)
+
+
+def iter_patterns(patterns, prefix=''):
+    for pattern in patterns:
+        if hasattr(pattern, 'url_patterns'):
+            yield from iter_patterns(
+                pattern.url_patterns, prefix + str(pattern.pattern))
+        else:
+            yield prefix + str(pattern.pattern), pattern.callback
+
+
+def get_route_actions(callback):
+    view = callback.cls
+    actions = getattr(callback, 'actions', None) or {
+        method: method for method in view.http_method_names
+        if method not in ('head', 'options') and hasattr(view, method)
+    }
+    return {
+        (view, method, action) for method, action in actions.items()
+        if method in view.http_method_names
+    }
+
+
+def get_api_routes():
+    # djoser.urls повторяет шаблоны роутера проекта, но запрос доходит
+    # только до первого совпавшего, поэтому повторы пропускаем.
+    seen = set()
+    routes = set()
+    for pattern, callback in iter_patterns(get_resolver().url_patterns):
+        if not pattern.startswith('api/') or pattern in seen:
+            continue
+        seen.add(pattern)
+        routes |= get_route_actions(callback)
+    return routes
+
+
+def create_accounts():
+    password = make_password(PASSWORD)
+    return {
+        name: User.objects.create(
+            username=f'{SEED_PREFIX}-{name}'.replace('_', '-'),
+            email=f'{SEED_PREFIX}-{name}@foodgram.example.org'.replace(
+                '_', '-'),
+            first_name='Имя', last_name='Фамилия', password=password,
+            is_staff=name == 'admin', is_active=name != 'inactive_user'
+        )
+        for name in ACCOUNTS
+    }
+
+
+def create_author_recipes(author, context):
+    recipes = Recipe.objects.bulk_create([
+        Recipe(
+            author=author, name=f'{SEED_PREFIX} рецепт автора {number}',
+            text='Описание', image=SEED_IMAGE, cooking_time=10
+        )
+        for number in range(AUTHOR_RECIPES)
+    ])
+    recipes = Recipe.objects.filter(author=author)
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe=recipe, tag=context['tags'][0])
+        for recipe in recipes
+    ])
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+        for recipe in recipes
+        for ingredient in context['ingredients'][:3]
+    ])
+    Favorite.objects.bulk_create([
+        Favorite(user=context['user'], recipe=recipe) for recipe in recipes
+    ])
+    update_search_index([recipe.id for recipe in recipes])
+    recount_counters(recipes, User.objects.filter(
+        pk__in=(author.pk, context['user'].pk)))
+
+
+class Command(BaseCommand):
+    help = ('Проверяем количество и время SQL-запросов для эндпоинтов API '
+            'на тестовом наборе данных')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=120)
+        parser.add_argument(
+            '--max-query-time', type=float, default=0.1,
+            help='Максимальное время одного запроса, в секундах.'
+        )
+
+    def handle(self, *args, **options):
+        with seeded_dataset(
+            users=options['users'], recipes=options['recipes']
+        ) as dataset:
+            context = get_dataset_context(dataset)
+            context.update(create_accounts())
+            create_author_recipes(context['deleted_author'], context)
+            failures = self.check_coverage(context)
+            failures += self.check_cursor_walks(context)
+            failures += [
+                failure
+                for budget in BUDGETS
+                for failure in self.check_budget(budget, context, options)
+            ]
+        if failures:
+            raise CommandError(
+                'Превышен бюджет запросов:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все бюджеты соблюдены'))
+
+    def check_coverage(self, context):
+        covered = set()
+        for budget in BUDGETS:
+            match = resolve(urlsplit(
+                budget.path.format(limit=SMALL_LIMIT, **context)).path)
+            covered |= {
+                route for route in get_route_actions(match.func)
+                if route[1] == budget.method
+            }
+        return [
+            f'{view.__name__}.{action} ({method.upper()}): нет бюджета'
+            for view, method, action in sorted(
+                get_api_routes() - covered,
+                key=lambda route: (route[0].__name__, route[2], route[1]))
+        ]
+
+    def get_client(self, budget, context):
+        client = APIClient()
+        if not budget.anonymous:
+            token, _ = Token.objects.get_or_create(user=context[budget.user])
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            # Токен разрешается из кэша, как на рабочем сервере после
+            # первого запроса пользователя.
+            CachedTokenAuthentication().authenticate_credentials(token.key)
+        return client
+
+    def measure(self, budget, context, limit):
+        client = self.get_client(budget, context)
+        data = budget.data(dict(context, limit=limit)) if budget.data else None
+        path = budget.path.format(limit=limit, **context)
+        user_recipes_cache.clear()
+        recipe_response_cache.clear()
+        detector = QueryDetector(settings.NPLUSONE_THRESHOLD)
+        with CaptureQueriesContext(connection) as queries, track_queries(
+            detector
+        ):
+            response = getattr(client, budget.method)(
+                path, data=data, format='json')
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        if (
+            response.status_code >= 400 if budget.status is None
+            else response.status_code != budget.status
+        ):
+            raise CommandError(
+                f'{budget.name}: {response.status_code} {path} '
+                f'{response.content[:200]!r}')
+        times = [float(query['time']) for query in queries.captured_queries]
+        return len(queries), max(times, default=0), detector.findings()
+
+    def check_cursor_walks(self, context):
+        failures = []
+        for budget in BUDGETS:
+            if budget.method != 'get' or 'cursor=' not in budget.path:
+                continue
+            client = self.get_client(budget, context)
+            path = budget.path.format(limit=WALK_LIMIT, **context)
+            url = urlsplit(path)
+            expected = self.get_json(client, budget, url._replace(query=(
+                urlencode([
+                    (name, value) for name, value in parse_qsl(url.query)
+                    if name != 'cursor'
+                ])
+            )).geturl())['count']
+            seen = []
+            while path and len(seen) <= expected:
+                data = self.get_json(client, budget, path)
+                seen += [item['id'] for item in data['results']]
+                path = data['next']
+            if len(seen) != expected or len(set(seen)) != len(seen):
+                failures.append(
+                    f'{budget.name}: курсор выдал {len(seen)} записей, '
+                    f'из них разных {len(set(seen))}, ожидалось {expected}')
+        return failures
+
+    def get_json(self, client, budget, path):
+        response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(
+                f'{budget.name}: {response.status_code} {path}')
+        return response.json()
+
+    def check_budget(self, budget, context, options):
+        limits = (
+            (SMALL_LIMIT, LARGE_LIMIT)
+            if budget.scales or '{limit}' in budget.path else (None,)
+        )
+        counts = []
+        for limit in limits:
+            count, slowest, findings = self.measure(budget, context, limit)
+            counts.append(count)
+            self.stdout.write(
+                f'{budget.name} (limit={limit}): {count} запросов '
+                f'(бюджет {budget.max_queries}), '
+                f'самый долгий {slowest * 1000:.1f} мс'
+            )
+            if count > budget.max_queries:
+                yield (f'{budget.name}: {count} запросов при бюджете '
+                       f'{budget.max_queries}')
+            if slowest > options['max_query_time']:
+                yield f'{budget.name}: запрос выполнялся {slowest:.3f} с'
+            for finding in findings:
+                yield format_finding(budget.name, finding)
+        if len(set(counts)) > 1:
+            yield (f'{budget.name}: число запросов растёт с размером '
+                   f'страницы {counts}')
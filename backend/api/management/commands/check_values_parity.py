@@ -0,0 +1,108 @@
+import json
+from urllib.parse import parse_qsl, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.management.dataset import get_dataset_context, seeded_dataset
+from api.membership import user_recipes_cache
+from api.response_cache import recipe_response_cache
+from api.views import RecipeViewSet
+from recipes.models import Recipe
+
+QUERIES = (
+    ('anonymous', {'limit': 50}),
+    ('user', {'limit': 50}),
+    ('user', {'limit': 50, 'page': 2}),
+    ('user', {'limit': 50, 'cursor': ''}),
+    ('user', {'limit': 50, 'tags': '{tag_slug}'}),
+    ('user', {'limit': 50, 'is_favorited': 1}),
+    ('user', {'limit': 50, 'is_in_shopping_cart': 1}),
+    ('user', {'limit': 50, 'author': '{author}'}),
+    ('user', {'limit': 50, 'search': '{search}'}),
+    ('user', {'limit': 10, 'search': '{search_word}', 'cursor': ''}),
+)
+
+# Ограничение на случай курсора, который не переходит дальше.
+MAX_PAGES = 20
+
+IMAGE_VARIANTS = {
+    'thumbnail': {'jpeg': 'recipes/variants/seed_thumbnail.jpg'},
+    'card': {'jpeg': 'recipes/variants/seed_card.jpg'},
+}
+
+
+def normalize(data):
+    for recipe in data['results']:
+        recipe['tags'].sort(key=lambda tag: tag['id'])
+        recipe['ingredients'].sort(key=lambda ingredient: ingredient['id'])
+    return data
+
+
+class Command(BaseCommand):
+    help = ('Сравниваем список рецептов, собранный из values(), с выводом '
+            'RecipeGetSerializer на тестовом наборе данных')
+
+    def handle(self, *args, **options):
+        views = {
+            'values()': RecipeViewSet.as_view({'get': 'list'}),
+            'RecipeGetSerializer': RecipeViewSet.as_view(
+                {'get': 'list'}, values_serializer_class=None),
+        }
+        with seeded_dataset() as dataset:
+            Recipe.objects.filter(
+                pk__in=[recipe.pk for recipe in dataset.recipes[::3]]
+            ).update(image_variants=IMAGE_VARIANTS)
+            context = get_dataset_context(dataset)
+            failures = []
+            for user, query in QUERIES:
+                query = {
+                    name: str(value).format(**context)
+                    for name, value in query.items()
+                }
+                results = {
+                    name: self.get_pages(
+                        view, query,
+                        context['user'] if user == 'user' else None)
+                    for name, view in views.items()
+                }
+                values, expected = results.values()
+                ids = [
+                    recipe['id']
+                    for page in expected for recipe in page['results']
+                ]
+                if values != expected:
+                    failures.append(f'{user} {query}')
+                if len(set(ids)) != len(ids):
+                    failures.append(f'{user} {query}: страницы повторяются')
+                self.stdout.write(
+                    f'{user} {query}: {len(ids)} рецептов, '
+                    f'страниц {len(expected)}, '
+                    f'{"совпадает" if values == expected else "ОТЛИЧАЕТСЯ"}'
+                )
+        if failures:
+            raise CommandError(
+                'Вывод values() отличается от RecipeGetSerializer:\n'
+                + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Вывод совпадает'))
+
+    def get_pages(self, view, query, user):
+        pages = [self.get_data(view, query, user)]
+        while pages[-1]['next'] and len(pages) <= MAX_PAGES:
+            pages.append(self.get_data(
+                view, dict(parse_qsl(urlsplit(pages[-1]['next']).query)),
+                user))
+        return pages
+
+    def get_data(self, view, query, user):
+        request = APIRequestFactory().get('/api/recipes/', query)
+        if user is not None:
+            force_authenticate(request, user)
+        user_recipes_cache.clear()
+        recipe_response_cache.clear()
+        response = view(request)
+        if hasattr(response, 'render'):
+            response.render()
+        if response.status_code != 200:
+            raise CommandError(f'{query}: {response.status_code}')
+        return normalize(json.loads(response.content))
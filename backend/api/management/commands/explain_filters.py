@@ -0,0 +1,129 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.management.dataset import seeded_dataset
+from api.membership import user_recipes_cache
+
+PATHS = (
+    '/api/recipes/?author={author}',
+    '/api/recipes/?tags={tag_slug}',
+    '/api/recipes/?tags={tag_slug}&tags={other_tag_slug}',
+    '/api/recipes/?is_favorited=1',
+    '/api/recipes/?is_in_shopping_cart=1',
+    '/api/recipes/?author={author}&tags={tag_slug}',
+    '/api/recipes/?tags={tag_slug}&is_favorited=1',
+    '/api/recipes/?is_favorited=1&is_in_shopping_cart=1',
+    '/api/recipes/?search={search}',
+    '/api/recipes/?search={search}&tags={tag_slug}',
+    '/api/recipes/download_shopping_cart/',
+    '/api/users/subscriptions/?recipes_limit=3',
+)
+
+SEQUENTIAL_SCANS = {
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+    'sqlite': re.compile(
+        r'^SCAN (?:TABLE )?(\w+)(?!.* (?:USING|VIRTUAL TABLE) )'),
+}
+EXPLAIN_PREFIXES = {
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+
+
+class Command(BaseCommand):
+    help = ('Проверяем через EXPLAIN, что фильтры рецептов и подписки '
+            'не читают большие таблицы целиком')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Полный просмотр таблиц меньше этого размера допустим.'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor not in EXPLAIN_PREFIXES:
+            raise CommandError(
+                f'EXPLAIN для {connection.vendor} не поддерживается')
+        with seeded_dataset(
+            users=options['users'], recipes=options['recipes'],
+            ingredients=options['recipes'] // 5, tags=options['tags'],
+            favorites_per_user=50, cart_per_user=15,
+            subscriptions_per_user=20,
+        ) as dataset:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            large_tables = self.get_large_tables(options['min_rows'])
+            context = self.get_context(dataset)
+            failures = [
+                failure
+                for path in PATHS
+                for failure in self.explain(
+                    path.format(**context), context, large_tables)
+            ]
+        if failures:
+            raise CommandError(
+                'Найдены полные просмотры таблиц:\n' + '\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('Все фильтры используют индексы'))
+
+    def get_large_tables(self, min_rows):
+        large_tables = set()
+        with connection.cursor() as cursor:
+            for table in connection.introspection.table_names(cursor):
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                if cursor.fetchone()[0] >= min_rows:
+                    large_tables.add(table)
+        return large_tables
+
+    def get_context(self, dataset):
+        user = dataset.recipes[0].author
+        token, _ = Token.objects.get_or_create(user=user)
+        return {
+            'token': token.key,
+            'author': dataset.users[-1].id,
+            'tag_slug': dataset.tags[0].slug,
+            'other_tag_slug': dataset.tags[-1].slug,
+            'search': dataset.ingredients[0].name,
+        }
+
+    def explain(self, path, context, large_tables):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {context["token"]}')
+        user_recipes_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(path)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+        if response.status_code >= 400:
+            raise CommandError(f'{path}: {response.status_code}')
+        pattern = SEQUENTIAL_SCANS[connection.vendor]
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            plan = self.get_plan(sql)
+            scanned = {
+                match.group(1)
+                for line in plan
+                for match in [pattern.search(line.strip())] if match
+            } & large_tables
+            self.stdout.write(f'{path}: {sql[:80]}...')
+            for line in plan:
+                self.stdout.write(f'    {line}')
+            for table in sorted(scanned):
+                yield f'{path}: {table}\n{sql}'
+
+    def get_plan(self, sql):
+        # SQL из CaptureQueriesContext уже содержит подставленные
+        # параметры, поэтому запрос можно передать в EXPLAIN как есть.
+        with connection.cursor() as cursor:
+            cursor.execute(EXPLAIN_PREFIXES[connection.vendor] + sql)
+            return [row[-1] for row in cursor.fetchall()]
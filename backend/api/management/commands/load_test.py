@@ -0,0 +1,265 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from statistics import quantiles
+from threading import Lock
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.management.dataset import (SEED_PREFIX, delete_seed_dataset,
+                                    seed_dataset, seeded_dataset)
+from api.management.journeys import VirtualUser, choose_journey
+from recipes.models import Tag
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = Lock()
+        self.latencies = {}
+        self.errors = {}
+
+    def add(self, name, seconds, error=None):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+            if error is not None:
+                self.errors.setdefault(name, []).append(error)
+
+
+class TestClientSession:
+    def __init__(self, recorder, token=None):
+        self.recorder = recorder
+        self.client = APIClient()
+        if token is not None:
+            self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def request(self, name, method, path, params=None, expected=200):
+        started = time.perf_counter()
+        if method == 'get':
+            response = self.client.get(path, params)
+        else:
+            response = getattr(self.client, method)(path)
+        if getattr(response, 'streaming', False):
+            b''.join(response.streaming_content)
+        content = response.content if not response.streaming else b''
+        return self.finish(
+            name, started, response.status_code, expected, content)
+
+    def finish(self, name, started, status, expected, content):
+        error = None if status == expected else f'{status}'
+        self.recorder.add(name, time.perf_counter() - started, error)
+        if error is None and content and status == 200:
+            try:
+                return json.loads(content)
+            except ValueError:
+                return None
+        return None
+
+
+class HTTPSession(TestClientSession):
+    def __init__(self, recorder, url, token=None):
+        self.recorder = recorder
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        if token is not None:
+            self.session.headers['Authorization'] = f'Token {token}'
+
+    def request(self, name, method, path, params=None, expected=200):
+        started = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, f'{self.url}{path}', params=params)
+        except requests.RequestException as error:
+            self.recorder.add(
+                name, time.perf_counter() - started, type(error).__name__)
+            return None
+        return self.finish(
+            name, started, response.status_code, expected, response.content)
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    if len(latencies) > 1:
+        percentiles = quantiles(latencies, n=100, method='inclusive')
+    else:
+        percentiles = latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'throughput': round(len(latencies) / elapsed, 2),
+        'p50': round(percentiles[49] * 1000, 2),
+        'p95': round(percentiles[94] * 1000, 2),
+        'p99': round(percentiles[98] * 1000, 2),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный тест: виртуальные пользователи проходят типичные '
+            'сценарии (просмотр рецептов по тегам, избранное, список '
+            'покупок, подписки, поиск ингредиентов) через тестовый клиент '
+            'Django или по HTTP, результаты сохраняются в JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, который работает с той же базой. '
+                 'Без него запросы идут через тестовый клиент Django.'
+        )
+        parser.add_argument('--concurrency', type=int, default=1)
+        parser.add_argument('--journeys', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=500)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Куда сохранить результаты.')
+        parser.add_argument(
+            '--baseline',
+            help='Результаты прошлого запуска для сравнения p95.'
+        )
+        parser.add_argument(
+            '--max-regression', type=float, default=0.2,
+            help='Допустимый рост p95 относительно --baseline (0.2 = 20%%).'
+        )
+
+    def handle(self, *args, **options):
+        if options['url'] is None and options['concurrency'] > 1:
+            raise CommandError(
+                'Тестовый клиент работает в одном потоке: для параллельной '
+                'нагрузки запустите сервер и передайте --url')
+        seed_options = {
+            'users': max(20, options['concurrency']),
+            'recipes': options['recipes'],
+            'ingredients': options['recipes'],
+            'tags': 10,
+            'random_seed': options['seed'],
+        }
+        if options['url'] is None:
+            with seeded_dataset(**seed_options) as dataset:
+                results = self.run(dataset, options)
+        elif Tag.objects.filter(slug__startswith=f'{SEED_PREFIX}-').exists():
+            raise CommandError(
+                'В базе уже есть тестовые данные, удалите их перед запуском')
+        else:
+            # Серверу нужны сохранённые данные, поэтому удаляем их сами
+            # после прогона.
+            try:
+                results = self.run(seed_dataset(**seed_options), options)
+            finally:
+                delete_seed_dataset()
+        self.report(results)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["output"]}')
+        if options['baseline']:
+            self.compare(results, options['baseline'],
+                         options['max_regression'])
+
+    def run(self, dataset, options):
+        context = {
+            'tag_slugs': [tag.slug for tag in dataset.tags],
+            'ingredient_names': [
+                ingredient.name for ingredient in dataset.ingredients],
+            'recipe_ids': [recipe.id for recipe in dataset.recipes],
+        }
+        recorder = Recorder()
+        visitors = [
+            self.get_visitors(recorder, user, options)
+            for user in dataset.users[:options['concurrency']]
+        ]
+        counts = [
+            len(range(worker, options['journeys'], options['concurrency']))
+            for worker in range(options['concurrency'])
+        ]
+
+        def worker(number):
+            rng = random.Random(options['seed'] + number)
+            visitor, anonymous_visitor = visitors[number]
+            for _ in range(counts[number]):
+                journey, anonymous = choose_journey(rng)
+                journey(
+                    anonymous_visitor if anonymous else visitor, context, rng)
+
+        started = time.perf_counter()
+        if options['url'] is None:
+            # Данные видны только внутри транзакции этого потока.
+            worker(0)
+        else:
+            with ThreadPoolExecutor(options['concurrency']) as executor:
+                list(executor.map(worker, range(options['concurrency'])))
+        elapsed = time.perf_counter() - started
+        total = [
+            latency
+            for latencies in recorder.latencies.values()
+            for latency in latencies
+        ]
+        return {
+            'started_at': datetime.now(timezone.utc).isoformat(),
+            'mode': 'http' if options['url'] else 'test-client',
+            'url': options['url'],
+            'concurrency': options['concurrency'],
+            'journeys': options['journeys'],
+            'seed': options['seed'],
+            'duration': round(elapsed, 3),
+            'total': summarize(
+                total,
+                [error for errors in recorder.errors.values()
+                 for error in errors],
+                elapsed),
+            'endpoints': {
+                name: summarize(
+                    latencies, recorder.errors.get(name, []), elapsed)
+                for name, latencies in sorted(recorder.latencies.items())
+            },
+            'errors': {
+                name: sorted(set(errors))
+                for name, errors in recorder.errors.items()
+            },
+        }
+
+    def get_visitors(self, recorder, user, options):
+        token, _ = Token.objects.get_or_create(user=user)
+        if options['url']:
+            return (
+                VirtualUser(HTTPSession(recorder, options['url'], token.key),
+                            user),
+                VirtualUser(HTTPSession(recorder, options['url'])),
+            )
+        return (
+            VirtualUser(TestClientSession(recorder, token.key), user),
+            VirtualUser(TestClientSession(recorder)),
+        )
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"Эндпоинт":<45}{"запросов":>9}{"ошибок":>8}{"зап/с":>8}'
+            f'{"p50, мс":>9}{"p95, мс":>9}{"p99, мс":>9}')
+        rows = [*results['endpoints'].items(), ('Всего', results['total'])]
+        for name, stats in rows:
+            self.stdout.write(
+                f'{name:<45}{stats["requests"]:>9}{stats["errors"]:>8}'
+                f'{stats["throughput"]:>8.1f}{stats["p50"]:>9.1f}'
+                f'{stats["p95"]:>9.1f}{stats["p99"]:>9.1f}')
+        for name, errors in results['errors'].items():
+            self.stderr.write(f'{name}: ответы {", ".join(errors)}')
+
+    def compare(self, results, baseline_path, max_regression):
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        regressions = []
+        for name, stats in results['endpoints'].items():
+            previous = baseline['endpoints'].get(name)
+            if previous is None or not previous['p95']:
+                continue
+            change = stats['p95'] / previous['p95'] - 1
+            self.stdout.write(
+                f'{name}: p95 {previous["p95"]:.1f} → {stats["p95"]:.1f} мс '
+                f'({change:+.0%})')
+            if change > max_regression:
+                regressions.append(f'{name}: p95 вырос на {change:.0%}')
+        if regressions:
+            raise CommandError(
+                'Регрессия относительно ' + baseline_path + ':\n'
+                + '\n'.join(regressions))
@@ -0,0 +1,175 @@
+import random
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.test import override_settings
+
+from recipes.counters import recount_counters
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.search import update_search_index
+from users.models import Subscriptions, User
+
+SEED_PREFIX = 'seed'
+SEED_IMAGE = 'recipes/images/seed.png'
+SEED_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+)
+MEASUREMENT_UNITS = ('г', 'кг', 'мл', 'шт.', 'ст. л.', 'по вкусу')
+
+Dataset = namedtuple('Dataset', 'users tags ingredients recipes')
+
+
+def seed_dataset(users=20, recipes=120, ingredients=300, tags=3,
+                 ingredients_per_recipe=(3, 10), favorites_per_user=30,
+                 cart_per_user=12, subscriptions_per_user=10,
+                 random_seed=42):
+    rng = random.Random(random_seed)
+
+    Tag.objects.bulk_create([
+        Tag(name=f'{SEED_PREFIX} {name}', color=color,
+            slug=f'{SEED_PREFIX}-{slug}')
+        for name, color, slug in SEED_TAGS[:tags]
+    ] + [
+        Tag(name=f'{SEED_PREFIX} тег {number}', color=f'#{number:06X}',
+            slug=f'{SEED_PREFIX}-tag-{number}')
+        for number in range(len(SEED_TAGS), tags)
+    ])
+    tags = list(Tag.objects.filter(slug__startswith=f'{SEED_PREFIX}-'))
+
+    Ingredient.objects.bulk_create([
+        Ingredient(
+            name=f'{SEED_PREFIX} ингредиент {number:04}',
+            measurement_unit=rng.choice(MEASUREMENT_UNITS)
+        )
+        for number in range(ingredients)
+    ])
+    ingredients = list(Ingredient.objects.filter(
+        name__startswith=f'{SEED_PREFIX} '))
+
+    password = make_password(None)
+    User.objects.bulk_create([
+        User(
+            username=f'{SEED_PREFIX}-user-{number}',
+            email=f'{SEED_PREFIX}-user-{number}@foodgram.example.org',
+            first_name='Имя', last_name='Фамилия', password=password
+        )
+        for number in range(users)
+    ])
+    users = list(User.objects.filter(
+        username__startswith=f'{SEED_PREFIX}-user-').order_by('id'))
+
+    Recipe.objects.bulk_create([
+        Recipe(
+            author=rng.choice(users),
+            name=f'{SEED_PREFIX} рецепт {number}',
+            text='Описание рецепта. ' * rng.randint(5, 50),
+            image=SEED_IMAGE,
+            cooking_time=rng.randint(5, 120)
+        )
+        for number in range(recipes)
+    ])
+    recipes = list(Recipe.objects.filter(
+        name__startswith=f'{SEED_PREFIX} ').order_by('id'))
+
+    Recipe.tags.through.objects.bulk_create([
+        Recipe.tags.through(recipe=recipe, tag=tag)
+        for recipe in recipes
+        for tag in rng.sample(tags, rng.randint(1, min(3, len(tags))))
+    ])
+    RecipeIngredient.objects.bulk_create([
+        RecipeIngredient(
+            recipe=recipe, ingredient=ingredient,
+            amount=rng.randint(1, 500)
+        )
+        for recipe in recipes
+        for ingredient in rng.sample(
+            ingredients, rng.randint(*ingredients_per_recipe))
+    ])
+    Favorite.objects.bulk_create([
+        Favorite(user=user, recipe=recipe)
+        for user in users
+        for recipe in rng.sample(
+            recipes, min(favorites_per_user, len(recipes)))
+    ])
+    ShoppingCart.objects.bulk_create([
+        ShoppingCart(user=user, recipe=recipe)
+        for user in users
+        for recipe in rng.sample(recipes, min(cart_per_user, len(recipes)))
+    ])
+    Subscriptions.objects.bulk_create([
+        Subscriptions(user=user, author=author)
+        for user in users
+        for author in rng.sample(
+            users, min(subscriptions_per_user + 1, len(users)))
+        if author != user
+    ])
+    recount_counters(
+        Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]),
+        User.objects.filter(pk__in=[user.pk for user in users])
+    )
+    update_search_index([recipe.pk for recipe in recipes])
+    return Dataset(users, tags, ingredients, recipes)
+
+
+# Набор живёт до конца блока: транзакция откатывается, а загруженные
+# изображения остаются во временном каталоге.
+@contextmanager
+def seeded_dataset(**options):
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        MEDIA_ROOT=media_root, ALLOWED_HOSTS=['testserver']
+    ), transaction.atomic():
+        try:
+            yield seed_dataset(**options)
+        finally:
+            transaction.set_rollback(True)
+
+
+def get_dataset_context(dataset):
+    user = dataset.recipes[0].author
+    favorites = set(user.favorite.values_list('recipe_id', flat=True))
+    carts = set(user.shopping_cart.values_list('recipe_id', flat=True))
+    authors = set(user.subscriber.values_list('author_id', flat=True))
+    new_recipe = next(
+        recipe.id for recipe in dataset.recipes
+        if recipe.id not in favorites | carts
+    )
+    return {
+        'user': user,
+        'tags': dataset.tags,
+        'ingredients': dataset.ingredients,
+        'tag': dataset.tags[0].id,
+        'tag_slug': dataset.tags[0].slug,
+        'ingredient': dataset.ingredients[0].id,
+        'prefix': dataset.ingredients[0].name[:6],
+        'search': dataset.ingredients[0].name,
+        # Слово есть в названиях всех тестовых рецептов и ингредиентов.
+        'search_word': dataset.ingredients[0].name.split()[0],
+        'recipes': dataset.recipes,
+        'recipe': dataset.recipes[-1].id,
+        'own_recipe': dataset.recipes[0].id,
+        'new_recipe': new_recipe,
+        'deleted_recipe': next(
+            recipe.id for recipe in reversed(dataset.recipes)
+            if recipe.author_id == user.id
+            and recipe.id not in (dataset.recipes[0].id, new_recipe)
+        ),
+        'author': dataset.users[-1].id,
+        'new_author': next(
+            author.id for author in dataset.users
+            if author.id not in authors and author != user
+        ),
+    }
+
+
+def delete_seed_dataset():
+    # Рецепты, избранное, списки покупок и подписки удаляются каскадом
+    # вместе с пользователями.
+    User.objects.filter(username__startswith=f'{SEED_PREFIX}-user-').delete()
+    Tag.objects.filter(slug__startswith=f'{SEED_PREFIX}-').delete()
+    Ingredient.objects.filter(name__startswith=f'{SEED_PREFIX} ').delete()
@@ -0,0 +1,119 @@
+class VirtualUser:
+    def __init__(self, client, user=None):
+        self.client = client
+        self.user = user
+        self.favorites = set()
+        self.shopping_cart = set()
+        if user is not None:
+            self.favorites = set(
+                user.favorite.values_list('recipe_id', flat=True))
+            self.shopping_cart = set(
+                user.shopping_cart.values_list('recipe_id', flat=True))
+
+
+def pick_new_recipes(rng, context, taken, count):
+    candidates = [
+        recipe_id for recipe_id in rng.sample(
+            context['recipe_ids'], min(len(context['recipe_ids']), count * 4))
+        if recipe_id not in taken
+    ]
+    return candidates[:count]
+
+
+def browse_recipes(visitor, context, rng):
+    client = visitor.client
+    params = {
+        'limit': 6,
+        'tags': rng.sample(context['tag_slugs'], rng.randint(1, 2)),
+    }
+    page = client.request('GET /api/recipes/', 'get', '/api/recipes/', params)
+    # Ошибку уже записал клиент, без списка продолжать сценарий нечем.
+    if page is None:
+        return
+    for recipe in rng.sample(page['results'], min(2, len(page['results']))):
+        client.request(
+            'GET /api/recipes/{id}/', 'get', f'/api/recipes/{recipe["id"]}/')
+    if page['next']:
+        client.request(
+            'GET /api/recipes/', 'get', '/api/recipes/',
+            dict(params, page=2))
+
+
+def toggle_favorite(visitor, context, rng):
+    client = visitor.client
+    for recipe_id in pick_new_recipes(rng, context, visitor.favorites, 1):
+        client.request(
+            'GET /api/recipes/{id}/', 'get', f'/api/recipes/{recipe_id}/')
+        client.request(
+            'POST /api/recipes/{id}/favorite/', 'post',
+            f'/api/recipes/{recipe_id}/favorite/', expected=201)
+        client.request(
+            'GET /api/recipes/?is_favorited=1', 'get', '/api/recipes/',
+            {'is_favorited': 1, 'limit': 6})
+        client.request(
+            'DELETE /api/recipes/{id}/favorite/', 'delete',
+            f'/api/recipes/{recipe_id}/favorite/', expected=204)
+
+
+def fill_shopping_cart(visitor, context, rng):
+    client = visitor.client
+    recipe_ids = pick_new_recipes(rng, context, visitor.shopping_cart, 3)
+    for recipe_id in recipe_ids:
+        client.request(
+            'POST /api/recipes/{id}/shopping_cart/', 'post',
+            f'/api/recipes/{recipe_id}/shopping_cart/', expected=201)
+    client.request(
+        'GET /api/recipes/download_shopping_cart/', 'get',
+        '/api/recipes/download_shopping_cart/')
+    for recipe_id in recipe_ids:
+        client.request(
+            'DELETE /api/recipes/{id}/shopping_cart/', 'delete',
+            f'/api/recipes/{recipe_id}/shopping_cart/', expected=204)
+
+
+def read_subscriptions(visitor, context, rng):
+    client = visitor.client
+    page = client.request(
+        'GET /api/users/subscriptions/', 'get', '/api/users/subscriptions/',
+        {'limit': 6, 'recipes_limit': 3})
+    if page is None or not page['results']:
+        return
+    author = rng.choice(page['results'])
+    client.request(
+        'GET /api/users/{id}/', 'get', f'/api/users/{author["id"]}/')
+    client.request(
+        'GET /api/recipes/?author={id}', 'get', '/api/recipes/',
+        {'author': author['id'], 'limit': 6})
+
+
+def search_ingredients(visitor, context, rng):
+    # Поле ввода ингредиента во фронтенде отправляет запрос подсказок на
+    # каждую набранную букву, затем выбранный ингредиент ищется в списке.
+    name = rng.choice(context['ingredient_names'])
+    for length in range(1, min(len(name), 6) + 1):
+        visitor.client.request(
+            'GET /api/ingredients/autocomplete/?name=', 'get',
+            '/api/ingredients/autocomplete/', {'name': name[:length]})
+    visitor.client.request(
+        'GET /api/ingredients/?name=', 'get', '/api/ingredients/',
+        {'name': name})
+
+
+def browse_anonymously(visitor, context, rng):
+    browse_recipes(visitor, context, rng)
+
+
+JOURNEYS = (
+    (browse_recipes, 40, False),
+    (browse_anonymously, 15, True),
+    (toggle_favorite, 15, False),
+    (fill_shopping_cart, 10, False),
+    (read_subscriptions, 10, False),
+    (search_ingredients, 10, False),
+)
+
+
+def choose_journey(rng):
+    journey, _, anonymous = rng.choices(
+        JOURNEYS, weights=[weight for _, weight, _ in JOURNEYS])[0]
+    return journey, anonymous
@@ -0,0 +1,87 @@
+from collections import namedtuple
+from time import time_ns
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import IntegerField, Value
+
+from recipes.models import Favorite, ShoppingCart
+
+from .lru import LRUCache
+
+FAVORITES = 0
+SHOPPING_CART = 1
+
+UserRecipes = namedtuple('UserRecipes', 'favorites shopping_cart')
+
+
+# frozenset занимает память по числу рецептов, а не по наибольшему id.
+EMPTY_USER_RECIPES = UserRecipes(frozenset(), frozenset())
+
+
+class UserRecipesCache:
+    # Сброс записи виден только своему процессу. Остальные процессы
+    # узнают о нём через поколение пользователя в общем кэше, а без общего
+    # кэша — не позже, чем через TTL.
+    def __init__(self, max_users, ttl, shared_cache=None,
+                 key_prefix='membership'):
+        self.shared_cache = caches[shared_cache] if shared_cache else None
+        self.key_prefix = key_prefix
+        self._entries = LRUCache(max_users, ttl)
+
+    def get(self, user_id):
+        shared_generation = self._get_shared_generation(user_id)
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] == shared_generation:
+            return entry[1]
+        checkpoint = self._entries.checkpoint()
+        user_recipes = self._load(user_id)
+        self._entries.set(
+            user_id, (shared_generation, user_recipes), checkpoint=checkpoint)
+        return user_recipes
+
+    def invalidate(self, user_id):
+        self._entries.pop(user_id)
+        if self.shared_cache is not None:
+            key = self._shared_key(user_id)
+            try:
+                self.shared_cache.incr(key)
+            except ValueError:
+                # Начинаем со времени, чтобы после вытеснения ключа
+                # поколение не совпало с запомненным в других процессах.
+                self.shared_cache.set(key, time_ns(), timeout=None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def _get_shared_generation(self, user_id):
+        if self.shared_cache is None:
+            return None
+        return self.shared_cache.get(self._shared_key(user_id))
+
+    def _shared_key(self, user_id):
+        return f'{self.key_prefix}:{user_id}'
+
+    def _load(self, user_id):
+        rows = Favorite.objects.filter(user_id=user_id).values_list(
+            'recipe_id', Value(FAVORITES, output_field=IntegerField())
+        ).union(ShoppingCart.objects.filter(user_id=user_id).values_list(
+            'recipe_id', Value(SHOPPING_CART, output_field=IntegerField())
+        ), all=True)
+        ids = ([], [])
+        for recipe_id, kind in rows:
+            ids[kind].append(recipe_id)
+        return UserRecipes(*(frozenset(kind_ids) for kind_ids in ids))
+
+
+user_recipes_cache = UserRecipesCache(
+    settings.MEMBERSHIP_CACHE['MAX_ENTRIES'],
+    settings.MEMBERSHIP_CACHE['TTL'],
+    settings.MEMBERSHIP_CACHE['SHARED_CACHE']
+)
+
+
+def get_user_recipes(user):
+    if not user.is_authenticated:
+        return EMPTY_USER_RECIPES
+    return user_recipes_cache.get(user.id)
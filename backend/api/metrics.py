@@ -0,0 +1,166 @@
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+from time import perf_counter
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+current_request = ContextVar('current_request', default=None)
+
+
+class RequestMetrics:
+    __slots__ = (
+        'started', 'queries', 'sql', 'render', 'serialize', 'serializing')
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.sql = 0.0
+        self.render = 0.0
+        self.serialize = 0.0
+        self.serializing = False
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql += perf_counter() - started
+
+
+def timed_render(render):
+    metrics = current_request.get()
+    if metrics is None:
+        return render
+
+    def wrapper():
+        started = perf_counter()
+        try:
+            return render()
+        finally:
+            metrics.render += perf_counter() - started
+
+    return wrapper
+
+
+def timed_serialization(method):
+    # Вложенные сериализаторы входят во время внешнего, а SQL-запросы,
+    # выполненные при сериализации, уже учтены во времени базы.
+    @wraps(method)
+    def wrapper(*args, **kwargs):
+        metrics = current_request.get()
+        if metrics is None or metrics.serializing:
+            return method(*args, **kwargs)
+        metrics.serializing = True
+        started, sql = perf_counter(), metrics.sql
+        try:
+            return method(*args, **kwargs)
+        finally:
+            metrics.serializing = False
+            metrics.serialize += max(
+                perf_counter() - started - (metrics.sql - sql), 0)
+
+    return wrapper
+
+
+class Histogram:
+    def __init__(self, name, description, buckets):
+        self.name = name
+        self.description = description
+        self.buckets = buckets
+        self._lock = Lock()
+        self._series = {}
+
+    def observe(self, label, value):
+        # Счётчики храним по отдельным корзинам, накопительные суммы
+        # для формата Prometheus считаем только при выгрузке.
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label)
+            if series is None:
+                series = self._series[label] = [
+                    [0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def collect(self, label_name):
+        with self._lock:
+            series = {
+                label: (list(counts), total)
+                for label, (counts, total) in self._series.items()
+            }
+        yield f'# HELP {self.name} {self.description}'
+        yield f'# TYPE {self.name} histogram'
+        for label, (counts, total) in sorted(series.items()):
+            labels = f'{label_name}="{label}"'
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += count
+                yield (f'{self.name}_bucket{{{labels},le="{bound}"}} '
+                       f'{cumulative}')
+            yield f'{self.name}_sum{{{labels}}} {total}'
+            yield f'{self.name}_count{{{labels}}} {cumulative}'
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+class ActionMetrics:
+    def __init__(self):
+        self.duration = Histogram(
+            'foodgram_request_duration_seconds',
+            'Полное время обработки запроса.', DURATION_BUCKETS)
+        self.sql_duration = Histogram(
+            'foodgram_request_sql_duration_seconds',
+            'Время SQL-запросов за один запрос.', DURATION_BUCKETS)
+        self.render_duration = Histogram(
+            'foodgram_request_render_duration_seconds',
+            'Время рендеринга ответа.', DURATION_BUCKETS)
+        self.serialize_duration = Histogram(
+            'foodgram_request_serialize_duration_seconds',
+            'Время сериализации ответа без SQL-запросов.', DURATION_BUCKETS)
+        self.sql_queries = Histogram(
+            'foodgram_request_sql_queries',
+            'Количество SQL-запросов за один запрос.', QUERY_BUCKETS)
+
+    def observe(self, action, metrics, total):
+        self.duration.observe(action, total)
+        self.sql_duration.observe(action, metrics.sql)
+        self.render_duration.observe(action, metrics.render)
+        self.serialize_duration.observe(action, metrics.serialize)
+        self.sql_queries.observe(action, metrics.queries)
+
+    def collect(self):
+        for histogram in (
+            self.duration, self.sql_duration, self.render_duration,
+            self.serialize_duration, self.sql_queries
+        ):
+            yield from histogram.collect('action')
+
+    def clear(self):
+        self.duration.clear()
+        self.sql_duration.clear()
+        self.render_duration.clear()
+        self.serialize_duration.clear()
+        self.sql_queries.clear()
+
+
+action_metrics = ActionMetrics()
+
+
+def collect_cache_metrics(name, stats):
+    for key in ('hits', 'misses', 'evictions'):
+        yield f'# TYPE foodgram_{name}_{key}_total counter'
+        yield f'foodgram_{name}_{key}_total {stats[key]}'
+    if stats['entries'] is not None:
+        yield f'# TYPE foodgram_{name}_entries gauge'
+        yield f'foodgram_{name}_entries {stats["entries"]}'
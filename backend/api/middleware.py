@@ -0,0 +1,128 @@
+import asyncio
+from time import perf_counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from .metrics import (RequestMetrics, action_metrics, current_request,
+                      record_query, timed_render)
+from .nplusone import (QueryDetector, current_detector, enable_query_detector,
+                       get_mode, report_findings)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Сигнал приходит при каждом переподключении, а список обёрток
+    # остаётся у объекта соединения.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def get_action(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return f'{view.__module__}.{view.__name__}'
+    actions = getattr(view, 'actions', None) or {}
+    method = request.method.lower()
+    return f'{cls.__name__}.{actions.get(method, method)}'
+
+
+class ContextVarMiddleware:
+    sync_capable = True
+    async_capable = True
+    context = None
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Как в MiddlewareMixin: Django проверяет, что экземпляр
+            # асинхронный, по этому атрибуту.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        state = self.start(request)
+        token = self.context.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.context.reset(token)
+        return self.finish(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.start(request)
+        token = self.context.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.context.reset(token)
+        return self.finish(request, response, state)
+
+    def start(self, request):
+        raise NotImplementedError
+
+    def finish(self, request, response, state):
+        raise NotImplementedError
+
+
+class PerformanceMiddleware(ContextVarMiddleware):
+    context = current_request
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        # Соединения, открытые до загрузки middleware, сигнал уже пропустили.
+        for connection in connections.all():
+            install_query_recorder(None, connection)
+
+    def start(self, request):
+        return RequestMetrics()
+
+    def process_template_response(self, request, response):
+        response.render = timed_render(response.render)
+        return response
+
+    def finish(self, request, response, metrics):
+        total = perf_counter() - metrics.started
+        action_metrics.observe(get_action(request), metrics, total)
+        if settings.SERVER_TIMING:
+            app = max(
+                total - metrics.sql - metrics.render - metrics.serialize, 0)
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={metrics.sql * 1000:.1f};'
+                f'desc="{metrics.queries} SQL"',
+                f'app;dur={app * 1000:.1f}',
+                f'serialize;dur={metrics.serialize * 1000:.1f}',
+                f'render;dur={metrics.render * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ))
+        return response
+
+
+class NPlusOneMiddleware(ContextVarMiddleware):
+    context = current_detector
+
+    def __init__(self, get_response):
+        self.mode = get_mode()
+        if not self.mode:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        enable_query_detector()
+
+    def start(self, request):
+        return QueryDetector(settings.NPLUSONE_THRESHOLD)
+
+    def finish(self, request, response, detector):
+        report_findings(
+            f'{request.method} {request.get_full_path()} '
+            f'({get_action(request)})',
+            detector.findings(), self.mode
+        )
+        return response
@@ -0,0 +1,225 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag, urlencode
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
+from recipes.catalog import get_catalog_version, get_recipes_generation
+from recipes.constants import CatalogConstants
+
+from .lru import LRUCache
+from .metrics import timed_render
+from .response_cache import recipe_response_cache
+
+catalog_response_cache = LRUCache(CatalogConstants.RESPONSE_CACHE_SIZE.value)
+
+# Каждый поток пула держит своё соединение с базой, поэтому размер пула
+# ограничивает и число соединений одного процесса.
+view_executor = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_VIEWS_THREADS, thread_name_prefix='api-view')
+
+
+def render_response(view, request, response):
+    renderer = request.accepted_renderer
+    content_type = request.accepted_media_type
+    if renderer.charset:
+        content_type += f'; charset={renderer.charset}'
+    return (
+        renderer.render(
+            response.data, request.accepted_media_type,
+            view.get_renderer_context()
+        ),
+        content_type
+    )
+
+
+class CatalogCacheMixin:
+    authentication_classes = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, super().retrieve, *args, **kwargs)
+
+    def get_cached_response(self, request, handler, *args, **kwargs):
+        renderer = request.accepted_renderer
+        if isinstance(renderer, BrowsableAPIRenderer):
+            return handler(request, *args, **kwargs)
+        version = get_catalog_version()
+        etag = quote_etag(md5(
+            f'{version}:{request.get_full_path()}:'
+            f'{request.accepted_media_type}'.encode()
+        ).hexdigest())
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            cached = catalog_response_cache.get(etag, version)
+            if cached is None:
+                cached = render_response(
+                    self, request, handler(request, *args, **kwargs))
+                catalog_response_cache.set(etag, cached, version)
+            response = HttpResponse(cached[0], content_type=cached[1])
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True,
+            max_age=CatalogConstants.CACHE_MAX_AGE.value
+        )
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class AnonymousResponseCacheMixin:
+
+    def list(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            request, super().retrieve, *args, **kwargs)
+
+    def get_anonymous_response(self, request, handler, *args, **kwargs):
+        if (
+            request.method not in SAFE_METHODS
+            or request.user.is_authenticated
+            or isinstance(request.accepted_renderer, BrowsableAPIRenderer)
+        ):
+            return handler(request, *args, **kwargs)
+        generation = get_recipes_generation()
+        query = urlencode(sorted(
+            (name, value)
+            for name, values in request.query_params.lists()
+            for value in values
+        ))
+        key = md5(
+            f'{request.build_absolute_uri(request.path)}?{query}:'
+            f'{request.accepted_media_type}'.encode()
+        ).hexdigest()
+        cached = recipe_response_cache.get(generation, key)
+        status = 'HIT'
+        if cached is None:
+            status = 'MISS'
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            cached = render_response(self, request, response)
+            recipe_response_cache.set(generation, key, cached)
+        response = HttpResponse(cached[0], content_type=cached[1])
+        response['X-Cache'] = status
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
+
+
+def split_fields(value):
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsMixin:
+
+    def get_sparse_fields(self, serializer_class=None):
+        params = self.request.query_params
+        if (
+            self.request.method not in SAFE_METHODS
+            or not ('fields' in params or 'omit' in params)
+        ):
+            return None
+        available = (
+            serializer_class or self.get_serializer_class()).Meta.fields
+        requested = (
+            split_fields(params['fields']) if 'fields' in params
+            else available
+        )
+        omitted = split_fields(params.get('omit', ''))
+        unknown = set(requested).union(omitted).difference(available)
+        if unknown:
+            raise ValidationError({
+                'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}.'
+            })
+        fields = [
+            field for field in available
+            if field in requested and field not in omitted
+        ]
+        if not fields:
+            raise ValidationError({'fields': 'Не выбрано ни одного поля.'})
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        return self.apply_sparse_fields(
+            super().get_serializer(*args, **kwargs))
+
+    def apply_sparse_fields(self, serializer):
+        target = getattr(serializer, 'child', serializer)
+        fields = self.get_sparse_fields(type(target))
+        if fields is not None:
+            for name in set(target.fields) - set(fields):
+                target.fields.pop(name)
+        return serializer
+
+
+class ValuesListMixin(SparseFieldsMixin):
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        if self.values_serializer_class is None:
+            return super().list(request, *args, **kwargs)
+        serializer = self.values_serializer_class(
+            context=self.get_serializer_context(),
+            fields=self.get_sparse_fields()
+        )
+        queryset = serializer.get_queryset(
+            self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(serializer.to_representation(queryset))
+        return self.get_paginated_response(serializer.to_representation(page))
+
+
+def run_view(view, request, *args, **kwargs):
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        # Рендерим ответ и дочитываем потоковый ответ в потоке пула:
+        # иначе Django сделает это в общем синхронном потоке или в цикле
+        # событий, где запросы к базе запрещены.
+        if hasattr(response, 'render'):
+            timed_render(response.render)()
+        # ASGI-обработчик Django 3.2 перебирает потоковый ответ синхронно в
+        # цикле событий, а соединение с базой закрывается ниже. Поэтому под
+        # ASGI список покупок собирается в памяти целиком и отдаётся после
+        # формирования; его размер ограничен числом разных ингредиентов.
+        if response.streaming:
+            response.streaming_content = list(response.streaming_content)
+        return response
+    finally:
+        close_old_connections()
+
+
+class AsyncViewSetMixin:
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_VIEWS:
+            return view
+
+        # Django 3.2 выполняет все синхронные представления под ASGI в одном
+        # общем потоке, поэтому запрос целиком уходит в ограниченный пул.
+        @wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await sync_to_async(
+                run_view, thread_sensitive=False, executor=view_executor
+            )(view, request, *args, **kwargs)
+
+        return async_view
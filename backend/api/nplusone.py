@@ -0,0 +1,163 @@
+import logging
+import re
+import sys
+import warnings
+from collections import Counter, namedtuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.serializers import BaseSerializer
+
+MODES = ('warn', 'log', 'raise')
+STACK_DEPTH = 5
+# Обёртки запросов и middleware есть в каждом стеке и места не подсказывают.
+SKIPPED_MODULES = ('nplusone', 'metrics', 'middleware')
+
+NORMALIZE_SQL = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+logger = logging.getLogger(__name__)
+
+current_detector = ContextVar('current_detector', default=None)
+
+Finding = namedtuple('Finding', 'template count field stack')
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+class NPlusOneWarning(UserWarning):
+    pass
+
+
+def normalize_sql(sql):
+    for pattern, replacement in NORMALIZE_SQL:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def describe_call_site():
+    # Поле сериализатора ищем по локальным переменным цикла в
+    # Serializer.to_representation, место вызова — по кадрам проекта.
+    field = None
+    stack = []
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if field is None and code.co_name == 'to_representation':
+            serializer = frame.f_locals.get('self')
+            current = frame.f_locals.get('field')
+            if isinstance(serializer, BaseSerializer) and current is not None:
+                field = f'{type(serializer).__name__}.{current.field_name}'
+        if (
+            len(stack) < STACK_DEPTH
+            and code.co_filename.startswith(base_dir)
+            and frame.f_globals.get('__name__', '').rpartition('.')[2]
+            not in SKIPPED_MODULES
+        ):
+            stack.append(
+                f'{code.co_filename[len(base_dir) + 1:]}:{frame.f_lineno} '
+                f'в {code.co_name}'
+            )
+        frame = frame.f_back
+    return field, stack
+
+
+class QueryDetector:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.call_sites = {}
+
+    def record(self, sql):
+        template = normalize_sql(sql)
+        self.counts[template] += 1
+        if self.counts[template] == self.threshold:
+            self.call_sites[template] = describe_call_site()
+
+    def findings(self):
+        return [
+            Finding(template, self.counts[template], field, stack)
+            for template, (field, stack) in self.call_sites.items()
+        ]
+
+
+def format_finding(name, finding):
+    lines = [
+        f'{name}: запрос повторяется {finding.count} раз: '
+        f'{finding.template[:200]}'
+    ]
+    if finding.field:
+        lines.append(f'  поле сериализатора: {finding.field}')
+    lines.extend(f'  {line}' for line in finding.stack)
+    return '\n'.join(lines)
+
+
+def report_findings(name, findings, mode):
+    if not findings:
+        return
+    message = '\n'.join(format_finding(name, finding) for finding in findings)
+    if mode == 'raise':
+        raise NPlusOneError(message)
+    if mode == 'warn':
+        warnings.warn(message, NPlusOneWarning)
+    else:
+        logger.warning(message)
+
+
+def get_mode():
+    mode = settings.NPLUSONE_DETECTOR
+    if mode and mode not in MODES:
+        raise ImproperlyConfigured(
+            f'NPLUSONE_DETECTOR должен быть одним из {", ".join(MODES)}')
+    return mode
+
+
+def detect_query(execute, sql, params, many, context):
+    detector = current_detector.get()
+    if detector is not None:
+        detector.record(sql)
+    return execute(sql, params, many, context)
+
+
+def install_query_detector(sender, connection, **kwargs):
+    if detect_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(detect_query)
+
+
+def enable_query_detector():
+    # Подключаемся только по требованию, чтобы без детектора запросы
+    # не проходили через лишнюю обёртку.
+    connection_created.connect(install_query_detector)
+    for connection in connections.all():
+        install_query_detector(None, connection)
+
+
+@contextmanager
+def track_queries(detector):
+    enable_query_detector()
+    token = current_detector.set(detector)
+    try:
+        yield detector
+    finally:
+        current_detector.reset(token)
+
+
+@contextmanager
+def detect_nplusone(name, mode=None, threshold=None):
+    detector = QueryDetector(threshold or settings.NPLUSONE_THRESHOLD)
+    with track_queries(detector):
+        yield detector
+    report_findings(
+        name, detector.findings(), mode or get_mode() or 'raise')
@@ -1,8 +1,38 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from recipes.constants import RecipesConstants
 
 
+class CustomCursorPagination(CursorPagination):
+    page_size = RecipesConstants.PAGE_SIZE.value
+    page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.ordering = (
+            queryset.query.order_by or queryset.model._meta.ordering)
+        return super().paginate_queryset(queryset, request, view)
+
+    def decode_cursor(self, request):
+        if not request.query_params.get(self.cursor_query_param):
+            return None
+        return super().decode_cursor(request)
+
+
 class CustomPagination(PageNumberPagination):
     page_size = RecipesConstants.PAGE_SIZE.value
     page_size_query_param = 'limit'
+    cursor_pagination_class = CustomCursorPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if (self.cursor_pagination_class.cursor_query_param
+                in request.query_params):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
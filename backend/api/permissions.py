@@ -7,4 +7,4 @@ class IsAuthenticatedAndAuthor(permissions.BasePermission):
         return request.user.is_authenticated
 
     def has_object_permission(self, request, view, obj):
-        return obj.author == request.user
+        return obj.author_id == request.user.id
@@ -0,0 +1,215 @@
+import os
+import shutil
+import stat
+import struct
+import tempfile
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+from recipes.catalog import bump_recipes_generation
+
+from .lru import LRUCache
+
+
+class BaseResponseCache:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._stats_lock = Lock()
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, generation, key):
+        response = self._get(generation, key)
+        with self._stats_lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    def set(self, generation, key, response):
+        evicted = self._set(generation, key, response)
+        if evicted:
+            with self._stats_lock:
+                self.evictions += evicted
+
+    def stats(self):
+        return {
+            'backend': type(self).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': self.size(),
+        }
+
+    def _get(self, generation, key):
+        raise NotImplementedError
+
+    def _set(self, generation, key, response):
+        raise NotImplementedError
+
+    def size(self):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+
+class LocMemResponseCache(BaseResponseCache):
+    def __init__(self, max_entries=1024):
+        super().__init__(max_entries)
+        self._responses = LRUCache(max_entries)
+
+    def _get(self, generation, key):
+        return self._responses.get(key, generation)
+
+    def _set(self, generation, key, response):
+        return self._responses.set(key, response, generation)
+
+    def size(self):
+        return len(self._responses)
+
+    def clear(self):
+        self._responses.clear()
+
+
+# Файл ответа: длина типа содержимого, сам тип в ASCII и тело ответа.
+# Формат только с данными: подложенный в каталог файл не выполнит код.
+FILE_HEADER = struct.Struct('>H')
+
+
+def encode_response(response):
+    content, content_type = response
+    if isinstance(content, str):
+        content = content.encode(settings.DEFAULT_CHARSET)
+    content_type = content_type.encode('ascii')
+    return FILE_HEADER.pack(len(content_type)) + content_type + content
+
+
+def decode_response(data):
+    if len(data) < FILE_HEADER.size:
+        return None
+    length, = FILE_HEADER.unpack_from(data)
+    start = FILE_HEADER.size + length
+    if len(data) < start:
+        return None
+    try:
+        content_type = data[FILE_HEADER.size:start].decode('ascii')
+    except UnicodeDecodeError:
+        return None
+    return data[start:], content_type
+
+
+class FileResponseCache(BaseResponseCache):
+    def __init__(self, max_entries=1024, location=None):
+        super().__init__(max_entries)
+        if not location:
+            raise ImproperlyConfigured(
+                'Для FileResponseCache задайте каталог в '
+                'RECIPE_RESPONSE_CACHE_LOCATION')
+        self.location = os.path.abspath(location)
+        os.makedirs(self.location, mode=0o700, exist_ok=True)
+        info = os.lstat(self.location)
+        if (
+            not stat.S_ISDIR(info.st_mode)
+            or info.st_uid != os.getuid()
+            or info.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+        ):
+            raise ImproperlyConfigured(
+                f'Каталог {self.location} должен принадлежать пользователю '
+                f'сервера и быть недоступным для записи другим')
+
+    def _path(self, generation, key=''):
+        return os.path.join(self.location, str(generation), key)
+
+    def _get(self, generation, key):
+        try:
+            with open(self._path(generation, key), 'rb') as file:
+                return decode_response(file.read())
+        except OSError:
+            return None
+
+    def _set(self, generation, key, response):
+        directory = self._path(generation)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        evicted = self._remove_generations(exclude=str(generation))
+        entries = sorted(
+            (entry for entry in os.scandir(directory) if entry.name != key),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        for entry in entries[:max(len(entries) - self.max_entries + 1, 0)]:
+            evicted += self._remove(entry.path)
+        # Пишем во временный файл и переименовываем, чтобы параллельный
+        # процесс не прочитал недописанный ответ.
+        descriptor, temporary = tempfile.mkstemp(dir=self.location)
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(encode_response(response))
+        os.replace(temporary, self._path(generation, key))
+        return evicted
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return 1
+
+    def _remove_generations(self, exclude=None):
+        evicted = 0
+        for entry in os.scandir(self.location):
+            if entry.is_dir() and entry.name != exclude:
+                evicted += sum(1 for _ in os.scandir(entry.path))
+                shutil.rmtree(entry.path, ignore_errors=True)
+        return evicted
+
+    def size(self):
+        if not os.path.isdir(self.location):
+            return 0
+        return sum(
+            sum(1 for _ in os.scandir(entry.path))
+            for entry in os.scandir(self.location) if entry.is_dir()
+        )
+
+    def clear(self):
+        if os.path.isdir(self.location):
+            self._remove_generations()
+
+
+class DjangoCacheResponseCache(BaseResponseCache):
+    # Общий для всех процессов вариант поверх любого кэша Django
+    # (Redis, Memcached). Старые поколения вытесняет сам кэш по таймауту.
+    def __init__(self, max_entries=None, alias='default', timeout=300,
+                 key_prefix='recipes:response'):
+        super().__init__(max_entries)
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.key_prefix = key_prefix
+
+    def _cache_key(self, generation, key):
+        return f'{self.key_prefix}:{generation}:{key}'
+
+    def _get(self, generation, key):
+        return self.cache.get(self._cache_key(generation, key))
+
+    def _set(self, generation, key, response):
+        self.cache.set(
+            self._cache_key(generation, key), response, self.timeout)
+        return 0
+
+    def size(self):
+        return None
+
+    def clear(self):
+        # Перечислить ключи в общем кэше нельзя, поэтому сбрасываем
+        # все записи сменой поколения.
+        bump_recipes_generation()
+
+
+def load_response_cache(config):
+    return import_string(config['BACKEND'])(**config.get('OPTIONS', {}))
+
+
+recipe_response_cache = load_response_cache(settings.RECIPE_RESPONSE_CACHE)
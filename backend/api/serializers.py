@@ -1,17 +1,53 @@
-from collections import Counter
+from collections import Counter, defaultdict
 
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.fields import SerializerMethodField
 
 from recipes.constants import RecipesConstants
+from recipes.images import IMAGE_VARIANTS
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 from users.models import Subscriptions, User
 
+from .membership import get_user_recipes
+from .metrics import timed_serialization
 
-class IngredientSerializer(serializers.ModelSerializer):
+
+def get_image_url(request, name):
+    url = Recipe._meta.get_field('image').storage.url(name)
+    return request.build_absolute_uri(url) if request else url
+
+
+def get_image_variant_urls(request, variants):
+    return {
+        variant: {
+            image_format: get_image_url(request, name)
+            for image_format, name in variants[variant].items()
+        }
+        for variant in IMAGE_VARIANTS
+        if variant in variants
+    }
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+
+    def to_representation(self, variants):
+        return get_image_variant_urls(self.context.get('request'), variants)
+
+
+class TimedSerializerMixin:
+
+    @timed_serialization
+    def to_representation(self, instance):
+        return super().to_representation(instance)
+
+
+class IngredientSerializer(TimedSerializerMixin,
+                           serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = '__all__'
@@ -37,7 +73,7 @@ class RecipeIngredientGetSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
@@ -64,6 +100,14 @@ class FavoriteSerializer(serializers.ModelSerializer):
         ).data
 
 
+class RecipeIdsSerializer(serializers.Serializer):
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=RecipesConstants.BULK_MAX_RECIPES.value
+    )
+
+
 class ShoppingCartSerializer(serializers.ModelSerializer):
     class Meta:
         model = ShoppingCart
@@ -85,10 +129,12 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         ).data
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(TimedSerializerMixin, UserSerializer):
     is_subscribed = SerializerMethodField()
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request.user is None or request.user.is_anonymous:
             return False
@@ -149,8 +195,10 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeGetSerializer(TimedSerializerMixin,
+                          serializers.ModelSerializer):
     image = Base64ImageField(read_only=True)
+    image_variants = ImageVariantsField()
     tags = TagSerializer(many=True, read_only=True)
     ingredients = RecipeIngredientGetSerializer(
         many=True, source='recipes_ingredients', read_only=True
@@ -161,25 +209,113 @@ class RecipeGetSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context.get('request').user
-        return user.is_authenticated and user.shopping_cart.filter(
-            recipe=obj).exists()
+        return obj.id in get_user_recipes(user).shopping_cart
 
     def get_is_favorited(self, obj):
         user = self.context.get('request').user
-        return user.is_authenticated and user.favorite.filter(
-            recipe=obj).exists()
+        return obj.id in get_user_recipes(user).favorites
+
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'image_variants', 'text', 'cooking_time'
         )
 
 
+class RecipeValuesSerializer:
+    recipe_fields = ('name', 'image', 'image_variants', 'text', 'cooking_time')
+    author_fields = ('email', 'id', 'username', 'first_name', 'last_name')
+
+    def __init__(self, context, fields=None):
+        self.context = context
+        self.fields = (
+            RecipeGetSerializer.Meta.fields if fields is None else fields)
+
+    def get_queryset(self, queryset):
+        columns = ['id'] + [
+            field for field in self.recipe_fields if field in self.fields]
+        if 'author' in self.fields:
+            columns += [f'author__{field}' for field in self.author_fields]
+        return queryset.prefetch_related(None).values(
+            *columns, *queryset.query.annotations)
+
+    def get_tags(self, recipe_ids):
+        tags = defaultdict(list)
+        for recipe_id, *tag in Recipe.tags.through.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('tag_id').values_list(
+            'recipe_id', 'tag__id', 'tag__name', 'tag__color', 'tag__slug'
+        ):
+            tags[recipe_id].append(
+                dict(zip(('id', 'name', 'color', 'slug'), tag)))
+        return tags
+
+    def get_ingredients(self, recipe_ids):
+        ingredients = defaultdict(list)
+        for recipe_id, *ingredient in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('id').values_list(
+            'recipe_id', 'ingredient__id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        ):
+            ingredients[recipe_id].append(dict(zip(
+                ('id', 'name', 'measurement_unit', 'amount'), ingredient)))
+        return ingredients
+
+    def get_author(self, row):
+        return {
+            **{
+                field: row[f'author__{field}']
+                for field in self.author_fields
+            },
+            'is_subscribed': bool(row['author_is_subscribed']),
+        }
+
+    @timed_serialization
+    def to_representation(self, rows):
+        rows = list(rows)
+        if not rows:
+            return []
+        request = self.context.get('request')
+        recipe_ids = [row['id'] for row in rows]
+        if 'tags' in self.fields:
+            tags = self.get_tags(recipe_ids)
+        if 'ingredients' in self.fields:
+            ingredients = self.get_ingredients(recipe_ids)
+        if {'is_favorited', 'is_in_shopping_cart'} & set(self.fields):
+            user_recipes = get_user_recipes(request.user)
+        getters = {
+            'id': lambda row: row['id'],
+            'tags': lambda row: tags[row['id']],
+            'author': self.get_author,
+            'ingredients': lambda row: ingredients[row['id']],
+            'is_favorited': lambda row: row['id'] in user_recipes.favorites,
+            'is_in_shopping_cart': (
+                lambda row: row['id'] in user_recipes.shopping_cart),
+            'name': lambda row: row['name'],
+            'image': lambda row: (
+                get_image_url(request, row['image'])
+                if row['image'] else None
+            ),
+            'image_variants': lambda row: get_image_variant_urls(
+                request, row['image_variants']),
+            'text': lambda row: row['text'],
+            'cooking_time': lambda row: row['cooking_time'],
+        }
+        return [
+            {field: getters[field](row) for field in self.fields}
+            for row in rows
+        ]
+
+
 class SubscriptionsGetSerializer(CustomUserSerializer):
-    recipes_count = serializers.SerializerMethodField()
     recipes = SerializerMethodField()
 
     class Meta:
@@ -190,10 +326,11 @@ class SubscriptionsGetSerializer(CustomUserSerializer):
             'recipes_count'
         )
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
+        if hasattr(obj, 'limited_recipes'):
+            return ShortRecipeSerializer(
+                obj.limited_recipes, many=True, read_only=True
+            ).data
         request = self.context.get('request')
         limit = request.GET.get('recipes_limit')
         recipes = obj.recipes.all()
@@ -248,6 +385,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
             )
         return image
 
+    @transaction.atomic
     def create(self, validated_data):
         request = self.context.get('request')
         ingredients = validated_data.pop('recipes_ingredients')
@@ -273,6 +411,7 @@ class RecipePostSerializer(serializers.ModelSerializer):
         self._create_ingredients(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('recipes_ingredients', None)
         tags = validated_data.pop('tags', None)
@@ -315,6 +454,10 @@ class RecipePostSerializer(serializers.ModelSerializer):
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], 'tags', Prefetch(
+            'recipes_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ))
         context = {'request': self.context['request']}
         return RecipeGetSerializer(instance, context=context).data
 
@@ -325,9 +468,12 @@ class RecipePostSerializer(serializers.ModelSerializer):
         )for ingredient in ingredients])
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(TimedSerializerMixin,
+                            serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
         fields = (
-            'id', 'name', 'image', 'cooking_time'
+            'id', 'name', 'image', 'image_variants', 'cooking_time'
         )
@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Favorite, ShoppingCart
+from users.mixins import relations_deleted
+from users.models import User
+
+from .authentication import token_user_cache
+from .membership import user_recipes_cache
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def user_recipes_changed(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: user_recipes_cache.invalidate(instance.user_id))
+
+
+@receiver(relations_deleted, sender=Favorite)
+@receiver(relations_deleted, sender=ShoppingCart)
+def user_recipes_deleted(sender, user_ids, **kwargs):
+    def invalidate():
+        for user_id in user_ids:
+            user_recipes_cache.invalidate(user_id)
+
+    transaction.on_commit(invalidate)
+
+
+# Выход через djoser удаляет токен, смена пароля и деактивация сохраняют
+# пользователя. Другие процессы увидят изменения не позже, чем через TTL
+# своего кэша.
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    # key — первичный ключ токена, после удаления Django обнуляет его
+    # в экземпляре, поэтому значение запоминаем сразу.
+    key = instance.key
+    transaction.on_commit(lambda: token_user_cache.invalidate(key))
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    transaction.on_commit(
+        lambda: token_user_cache.invalidate_user(instance.id))
@@ -1,14 +1,45 @@
-from io import StringIO
+import csv
+import json
 
+SHOPPING_LIST_FIELDS = ('name', 'measurement_unit', 'amount')
 
-def generate_shopping_list(ingredients_dict):
-    shopping_list_text = StringIO()
 
-    for ingredient_name, details in ingredients_dict.items():
-        quantity = details['quantity']
-        unit = details['unit']
-        shopping_list_text.write(
-            f'{ingredient_name} ({unit}) — {quantity}\n'
+class Echo:
+    def write(self, value):
+        return value
+
+
+def generate_shopping_list(ingredients):
+    for ingredient in ingredients:
+        yield (
+            f'{ingredient["name"]} ({ingredient["unit"]}) — '
+            f'{ingredient["quantity"]}\n'
         )
 
-    return shopping_list_text.getvalue()
+
+def generate_shopping_list_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(SHOPPING_LIST_FIELDS)
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['name'], ingredient['unit'], ingredient['quantity']
+        ))
+
+
+def generate_shopping_list_json(ingredients):
+    yield '['
+    separator = ''
+    for ingredient in ingredients:
+        yield separator + json.dumps(dict(zip(
+            SHOPPING_LIST_FIELDS,
+            (ingredient['name'], ingredient['unit'], ingredient['quantity'])
+        )), ensure_ascii=False)
+        separator = ','
+    yield ']'
+
+
+SHOPPING_LIST_GENERATORS = {
+    'txt': generate_shopping_list,
+    'csv': generate_shopping_list_csv,
+    'json': generate_shopping_list_json,
+}
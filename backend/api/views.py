@@ -1,46 +1,114 @@
-from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import (BooleanField, Exists, F, OuterRef, Prefetch, Sum,
+                              Value, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import permissions, status
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from recipes.constants import IngredientConstants, RecipesConstants
+from recipes.counters import recount
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 from users.models import Subscriptions, User
 
+from .autocomplete import ingredient_index
 from .filters import IngredientFilter, RecipeFilter
+from .membership import user_recipes_cache
+from .metrics import action_metrics, collect_cache_metrics
+from .mixins import (AnonymousResponseCacheMixin, AsyncViewSetMixin,
+                     CatalogCacheMixin, SparseFieldsMixin, ValuesListMixin)
 from .paginators import CustomPagination
 from .permissions import IsAuthenticatedAndAuthor
+from .renderers import CSVRenderer, PlainTextRenderer
+from .response_cache import recipe_response_cache
 from .serializers import (CustomUserSerializer, FavoriteSerializer,
                           IngredientSerializer, RecipeGetSerializer,
-                          RecipePostSerializer, ShoppingCartSerializer,
+                          RecipeIdsSerializer, RecipePostSerializer,
+                          RecipeValuesSerializer, ShoppingCartSerializer,
                           SubscriptionsGetSerializer,
                           SubscriptionsPostSerializer, TagSerializer)
-from .utils import generate_shopping_list
+from .utils import SHOPPING_LIST_GENERATORS
 
+RECIPE_MODEL_FIELDS = (
+    'name', 'image', 'image_variants', 'text', 'cooking_time')
+SHORT_RECIPE_MODEL_FIELDS = ('name', 'image', 'image_variants', 'cooking_time')
+USER_MODEL_FIELDS = (
+    'email', 'username', 'first_name', 'last_name', 'recipes_count')
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+
+class IngredientViewSet(AsyncViewSetMixin, CatalogCacheMixin,
+                        ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    @action(detail=False, methods=['get'])
+    def autocomplete(self, request):
+        return self.get_cached_response(request, self._autocomplete)
+
+    def _autocomplete(self, request):
+        limit = request.query_params.get('limit', '')
+        limit = (
+            min(int(limit), IngredientConstants.AUTOCOMPLETE_MAX_LIMIT.value)
+            if limit.isdigit()
+            else IngredientConstants.AUTOCOMPLETE_LIMIT.value
+        )
+        return Response(ingredient_index.search(
+            request.query_params.get('name', ''), limit))
+
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(AsyncViewSetMixin, CatalogCacheMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
 
-class RecipeViewSet(ModelViewSet):
+class RecipeViewSet(AsyncViewSetMixin, AnonymousResponseCacheMixin,
+                    ValuesListMixin, ModelViewSet):
     pagination_class = CustomPagination
+    values_serializer_class = RecipeValuesSerializer
     queryset = Recipe.objects.all()
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        if self.action == 'destroy':
+            return Recipe.objects.all()
+        user = self.request.user
+        fields = self.get_sparse_fields()
+        if fields is None:
+            fields = RecipeGetSerializer.Meta.fields
+        queryset = Recipe.objects.defer(*(
+            field for field in RECIPE_MODEL_FIELDS if field not in fields))
+        if 'tags' in fields:
+            queryset = queryset.prefetch_related('tags')
+        if 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipes_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ))
+        if 'author' not in fields:
+            return queryset
+        queryset = queryset.select_related('author')
+        if not user.is_authenticated:
+            return queryset.annotate(
+                author_is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(
+            author_is_subscribed=Exists(Subscriptions.objects.filter(
+                user=user, author=OuterRef('author')))
+        )
+
     def get_serializer_class(self):
         if self.request.method in permissions.SAFE_METHODS:
             return RecipeGetSerializer
@@ -54,6 +122,11 @@ class RecipeViewSet(ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(detail=False, methods=['get'], url_path='cache-stats',
+            permission_classes=[permissions.IsAdminUser])
+    def cache_stats(self, request):
+        return Response(recipe_response_cache.stats())
+
     @action(detail=True, methods=['post'])
     def favorite(self, request, pk=None):
         user = request.user
@@ -102,46 +175,131 @@ class RecipeViewSet(ModelViewSet):
         ).delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    @action(detail=False, methods=['get'])
-    def download_shopping_cart(self, request):
-        user = request.user
-        cart_items = ShoppingCart.objects.filter(user=user).order_by(
-            'recipe__recipes_ingredient__ingredient__name')
-        ingredients_dict = {}
+    @action(
+        detail=False, methods=['post'], url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        return self._bulk_add(request, Favorite, 'favorites_count')
+
+    @favorite_bulk.mapping.delete
+    def delete_favorite_bulk(self, request):
+        return self._bulk_remove(request, Favorite)
+
+    @action(
+        detail=False, methods=['post'], url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=[permissions.IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        return self._bulk_add(request, ShoppingCart, 'shopping_cart_count')
+
+    @shopping_cart_bulk.mapping.delete
+    def delete_shopping_cart_bulk(self, request):
+        return self._bulk_remove(request, ShoppingCart)
 
-        for cart_item in cart_items:
-            recipe_ingredients = RecipeIngredient.objects.filter(
-                recipe=cart_item.recipe
+    def _get_bulk_recipe_ids(self, request):
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return list(dict.fromkeys(serializer.validated_data['recipes']))
+
+    def _bulk_add(self, request, model, counter_field):
+        recipe_ids = self._get_bulk_recipe_ids(request)
+        with transaction.atomic():
+            existing_recipes = set(Recipe.objects.filter(
+                id__in=recipe_ids).values_list('id', flat=True))
+            already_added = set(model.objects.filter(
+                user=request.user, recipe_id__in=existing_recipes
+            ).values_list('recipe_id', flat=True))
+            added = existing_recipes - already_added
+            model.objects.bulk_create(
+                [model(user=request.user, recipe_id=recipe_id)
+                 for recipe_id in added],
+                ignore_conflicts=True
             )
-            for recipe_ingredient in recipe_ingredients:
-                ingredient_name = recipe_ingredient.ingredient.name
-                ingredient_quantity = recipe_ingredient.amount
-                ingredient_unit = recipe_ingredient.ingredient.measurement_unit
-
-                if ingredient_name in ingredients_dict:
-                    ingredients_dict[
-                        ingredient_name]['quantity'] += ingredient_quantity
-                else:
-                    ingredients_dict[ingredient_name] = {
-                        'quantity': ingredient_quantity,
-                        'unit': ingredient_unit
-                    }
-
-        shopping_list_text = generate_shopping_list(ingredients_dict)
-
-        response = HttpResponse(content_type='text/plain')
-        response[
-            'Content-Disposition'] = 'attachment; filename="shopping_list.txt"'
-        response.write(shopping_list_text)
+            # Параллельный запрос мог добавить те же рецепты: bulk_create
+            # пропустит дубликаты, а пересчёт по таблице даст точные значения.
+            recount(
+                Recipe.objects.filter(id__in=existing_recipes), counter_field)
+            transaction.on_commit(
+                lambda: user_recipes_cache.invalidate(request.user.id))
+        return Response([
+            {
+                'id': recipe_id,
+                'status': (
+                    'added' if recipe_id in added
+                    else 'already_added' if recipe_id in already_added
+                    else 'not_found'
+                )
+            }
+            for recipe_id in recipe_ids
+        ])
+
+    def _bulk_remove(self, request, model):
+        recipe_ids = self._get_bulk_recipe_ids(request)
+        with transaction.atomic():
+            relations = model.objects.filter(
+                user=request.user, recipe_id__in=recipe_ids)
+            removed = set(relations.values_list('recipe_id', flat=True))
+            # Счётчики и кэш участия обновляют получатели relations_deleted.
+            relations.delete()
+        return Response([
+            {
+                'id': recipe_id,
+                'status': 'removed' if recipe_id in removed else 'not_added'
+            }
+            for recipe_id in recipe_ids
+        ])
+
+    @action(
+        detail=False, methods=['get'],
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[PlainTextRenderer, CSVRenderer, JSONRenderer]
+    )
+    def download_shopping_cart(self, request):
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shopping_cart__user=request.user
+        ).values(
+            name=F('ingredient__name'),
+            unit=F('ingredient__measurement_unit')
+        ).annotate(
+            quantity=Sum('amount')
+        ).order_by('name', 'unit').iterator(
+            chunk_size=RecipesConstants.SHOPPING_LIST_CHUNK_SIZE.value
+        )
+        file_format = request.accepted_renderer.format
+
+        response = StreamingHttpResponse(
+            SHOPPING_LIST_GENERATORS[file_format](ingredients),
+            content_type=request.accepted_renderer.media_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{file_format}"'
+        )
 
         return response
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(SparseFieldsMixin, UserViewSet):
     queryset = User.objects.all()
     http_method_names = ['get', 'post', 'delete']
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        queryset = super().get_queryset().order_by('id')
+        user = self.request.user
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            queryset = queryset.only('id', *(
+                field for field in USER_MODEL_FIELDS if field in fields))
+        if user.is_authenticated and (
+                fields is None or 'is_subscribed' in fields):
+            return queryset.annotate(is_subscribed=Exists(
+                Subscriptions.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        return queryset
+
     def get_serializer_class(self):
         if (self.request.method in permissions.SAFE_METHODS
                 and self.request.user.is_authenticated):
@@ -181,8 +339,57 @@ class CustomUserViewSet(UserViewSet):
 
     @action(detail=False, methods=['get'], pagination_class=CustomPagination)
     def subscriptions(self, request):
-        queryset = User.objects.filter(following__user=request.user)
+        fields = self.get_sparse_fields(SubscriptionsGetSerializer)
+        if fields is None:
+            fields = SubscriptionsGetSerializer.Meta.fields
+        queryset = User.objects.filter(
+            following__user=request.user
+        ).only('id', *(
+            field for field in USER_MODEL_FIELDS if field in fields
+        )).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('id')
+        if 'recipes' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipes',
+                queryset=self._get_limited_recipes(request).only(
+                    'id', 'author', *SHORT_RECIPE_MODEL_FIELDS),
+                to_attr='limited_recipes'
+            ))
         pages = self.paginate_queryset(queryset)
-        serializer = SubscriptionsGetSerializer(
-            pages, many=True, context={'request': request})
+        serializer = self.apply_sparse_fields(SubscriptionsGetSerializer(
+            pages, many=True, context={'request': request}))
         return self.get_paginated_response(serializer.data)
+
+    def _get_limited_recipes(self, request):
+        recipes = Recipe.objects.all()
+        limit = request.query_params.get('recipes_limit', '')
+        if not limit.isdigit():
+            return recipes
+        ranked_sql, params = Recipe.objects.filter(
+            author__following__user=request.user
+        ).annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=F('id').desc()
+            )
+        ).values('id', 'row_number').query.sql_with_params()
+        return recipes.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({ranked_sql}) AS ranked '
+            f'WHERE ranked.row_number <= %s',
+            (*params, int(limit))
+        ))
+
+
+class MetricsView(APIView):
+    permission_classes = (permissions.IsAdminUser,)
+    renderer_classes = (PlainTextRenderer,)
+
+    def get(self, request):
+        lines = [
+            *action_metrics.collect(),
+            *collect_cache_metrics(
+                'recipe_response_cache', recipe_response_cache.stats()),
+        ]
+        return Response('\n'.join(lines) + '\n')
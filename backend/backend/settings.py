@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +63,19 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+ASGI_APPLICATION = 'backend.asgi.application'
+
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False').lower() == 'true'
+
+ASYNC_VIEWS_THREADS = int(os.getenv('ASYNC_VIEWS_THREADS', 8))
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True').lower() == 'true'
+
+# Поиск N+1: пусто — выключен, warn, log или raise.
+NPLUSONE_DETECTOR = os.getenv('NPLUSONE_DETECTOR', '')
+
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+
 
 if DEBUG:
     DATABASES = {
@@ -128,8 +143,45 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'api.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
+
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'api.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+RECIPE_RESPONSE_CACHE = {
+    'BACKEND': os.getenv(
+        'RECIPE_RESPONSE_CACHE_BACKEND', 'api.response_cache.LocMemResponseCache'
+    ),
+    'OPTIONS': {
+        'max_entries': int(os.getenv('RECIPE_RESPONSE_CACHE_SIZE', 1024)),
+    },
+}
+if os.getenv('RECIPE_RESPONSE_CACHE_LOCATION'):
+    RECIPE_RESPONSE_CACHE['OPTIONS']['location'] = os.getenv(
+        'RECIPE_RESPONSE_CACHE_LOCATION')
+
+TOKEN_AUTH_CACHE = {
+    'MAX_ENTRIES': int(os.getenv('TOKEN_AUTH_CACHE_SIZE', 4096)),
+    'TTL': int(os.getenv('TOKEN_AUTH_CACHE_TTL', 30)),
+    'SHARED_CACHE': os.getenv('TOKEN_AUTH_SHARED_CACHE'),
+}
+
+MEMBERSHIP_CACHE = {
+    'MAX_ENTRIES': int(os.getenv('MEMBERSHIP_CACHE_SIZE', 1024)),
+    'TTL': int(os.getenv('MEMBERSHIP_CACHE_TTL', 5)),
+    'SHARED_CACHE': os.getenv('MEMBERSHIP_SHARED_CACHE'),
 }
 
 DJOSER = {
@@ -32,7 +32,7 @@ class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInline,)
 
     def in_favorites(self, obj):
-        return obj.favorite.count()
+        return obj.favorites_count
 
     in_favorites.short_description = 'Добавлений в избранное'
 
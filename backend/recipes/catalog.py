@@ -0,0 +1,62 @@
+from time import time_ns
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import CacheGeneration
+
+# Поколения хранятся в базе, а не в кэше процесса: import_csv и фоновые
+# задачи работают в других процессах, и изменение должны увидеть все
+# воркеры.
+CATALOG_GENERATION = 'catalog'
+RECIPES_GENERATION = 'recipes'
+
+
+def _create_generation(name):
+    # Начальное значение берём из времени, чтобы после пересоздания базы
+    # поколения не совпали с записями, оставшимися в общих кэшах.
+    generation, _ = CacheGeneration.objects.get_or_create(
+        name=name, defaults={'value': time_ns()})
+    return generation.value
+
+
+def get_generation(name):
+    value = CacheGeneration.objects.filter(name=name).values_list(
+        'value', flat=True).first()
+    if value is None:
+        return _create_generation(name)
+    return value
+
+
+def bump_generation(name):
+    if not CacheGeneration.objects.filter(name=name).update(
+            value=F('value') + 1):
+        _create_generation(name)
+
+
+def get_catalog_version():
+    return get_generation(CATALOG_GENERATION)
+
+
+def bump_catalog_version():
+    bump_generation(CATALOG_GENERATION)
+
+
+def get_recipes_generation():
+    return get_generation(RECIPES_GENERATION)
+
+
+def bump_recipes_generation():
+    bump_generation(RECIPES_GENERATION)
+
+
+def bump_recipes_generation_on_commit():
+    # Рецепты меняются часто, поэтому строку поколения не блокируем до
+    # конца транзакции, а увеличиваем один раз после фиксации, сколько бы
+    # сигналов ни пришло.
+    connection = transaction.get_connection()
+    if not any(
+        callback is bump_recipes_generation
+        for _, callback in connection.run_on_commit
+    ):
+        transaction.on_commit(bump_recipes_generation)
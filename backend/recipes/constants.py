@@ -6,6 +6,16 @@ class RecipesConstants(Enum):
     MIN_COOKING_TIME = 1
     MAX_COOKING_TIME = 32767
     PAGE_SIZE = 6
+    SHOPPING_LIST_CHUNK_SIZE = 2000
+    BULK_MAX_RECIPES = 100
+
+
+class RecipeImageConstants(Enum):
+    THUMBNAIL_SIZE = 160
+    CARD_SIZE = 480
+    FULL_SIZE = 1200
+    QUALITY = 80
+    WORKERS = 2
 
 
 class TagsConstants(Enum):
@@ -18,3 +28,13 @@ class IngredientConstants(Enum):
     INGREDIENT_NAME_MAX_LENGTH = 200
     MEASUREMENT_UNIT_MAX_LENGTH = 200
     MIN_AMOUNT = 1
+    AUTOCOMPLETE_LIMIT = 20
+    AUTOCOMPLETE_MAX_LIMIT = 100
+    IMPORT_BATCH_SIZE = 1000
+    IMPORT_READ_SIZE = 65536
+
+
+class CatalogConstants(Enum):
+    CACHE_MAX_AGE = 60
+    RESPONSE_CACHE_SIZE = 512
+    GENERATION_NAME_MAX_LENGTH = 32
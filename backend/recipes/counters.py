@@ -0,0 +1,45 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Subscriptions, User
+
+from .models import Favorite, Recipe, ShoppingCart
+
+COUNTERS = {
+    Recipe: {
+        'favorites_count': (Favorite, 'recipe'),
+        'shopping_cart_count': (ShoppingCart, 'recipe'),
+    },
+    User: {
+        'recipes_count': (Recipe, 'author'),
+        'subscribers_count': (Subscriptions, 'author'),
+    },
+}
+
+
+def increment(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(**{field: F(field) + delta})
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def recount(queryset, *fields):
+    counters = COUNTERS[queryset.model]
+    queryset.update(**{
+        field: count_subquery(*counters[field])
+        for field in fields or counters
+    })
+
+
+def recount_counters(recipes=None, users=None):
+    recount(Recipe.objects.all() if recipes is None else recipes)
+    recount(User.objects.all() if users is None else users)
@@ -0,0 +1,85 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from PIL import Image, ImageOps, features
+
+from .catalog import bump_recipes_generation
+from .constants import RecipeImageConstants
+from .models import Recipe
+
+IMAGE_VARIANTS = {
+    'thumbnail': RecipeImageConstants.THUMBNAIL_SIZE.value,
+    'card': RecipeImageConstants.CARD_SIZE.value,
+    'full': RecipeImageConstants.FULL_SIZE.value,
+}
+IMAGE_FORMATS = {'jpeg': ('JPEG', 'jpg')}
+if features.check('webp'):
+    IMAGE_FORMATS = {'webp': ('WEBP', 'webp'), **IMAGE_FORMATS}
+VARIANTS_DIR = 'recipes/images/variants'
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(
+    max_workers=RecipeImageConstants.WORKERS.value,
+    thread_name_prefix='recipe-images'
+)
+
+
+def iter_variant_names(variants):
+    for variant in IMAGE_VARIANTS:
+        yield from variants.get(variant, {}).values()
+
+
+def build_image_variants(recipe_id):
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        'image', 'image_variants').first()
+    if recipe is None or not recipe.image:
+        return
+    source = recipe.image.name
+    storage = recipe.image.storage
+    with recipe.image.open('rb') as file:
+        image = ImageOps.exif_transpose(Image.open(file)).convert('RGB')
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = {'source': source}
+    for variant, size in IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        variants[variant] = {}
+        for image_format, (pil_format, extension) in IMAGE_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(
+                buffer, pil_format,
+                quality=RecipeImageConstants.QUALITY.value, optimize=True
+            )
+            variants[variant][image_format] = storage.save(
+                f'{VARIANTS_DIR}/{stem}_{variant}.{extension}',
+                ContentFile(buffer.getvalue())
+            )
+    if Recipe.objects.filter(pk=recipe_id, image=source).update(
+            image_variants=variants):
+        bump_recipes_generation()
+        stale_variants = recipe.image_variants
+    else:
+        stale_variants = variants
+    for name in iter_variant_names(stale_variants):
+        storage.delete(name)
+
+
+def _build_image_variants_in_background(recipe_id):
+    try:
+        build_image_variants(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось подготовить изображения рецепта %s', recipe_id)
+    finally:
+        connection.close()
+
+
+def schedule_image_variants(recipe):
+    if recipe.image and recipe.image_variants.get(
+            'source') != recipe.image.name:
+        executor.submit(_build_image_variants_in_background, recipe.pk)
@@ -1,31 +1,186 @@
 import csv
+import json
 import os
+from io import StringIO
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
+from recipes.catalog import bump_catalog_version
+from recipes.constants import IngredientConstants
 from recipes.models import Ingredient
 
 
+def read_csv(file):
+    reader = csv.reader(file)
+    try:
+        for row in reader:
+            if not row:
+                continue
+            if len(row) != 2:
+                raise CommandError(
+                    f'Строка {reader.line_num}: ожидались название и '
+                    f'единица измерения, получено полей: {len(row)}')
+            name, measurement_unit = row
+            yield name, measurement_unit
+    except csv.Error as error:
+        raise CommandError(f'Строка {reader.line_num}: {error}')
+
+
+def skip_whitespace(buffer, position):
+    while position < len(buffer) and buffer[position].isspace():
+        position += 1
+    return position
+
+
+def iter_json_array(file, read_size):
+    # Разбираем массив по одному элементу, не загружая файл целиком.
+    # Элемент принимаем, только когда за ним прочитаны запятая или «]»:
+    # число на границе блока иначе могло бы прочитаться не полностью.
+    decoder = json.JSONDecoder()
+    buffer, position, offset = '', 0, 0
+    started = empty = finished = eof = False
+    while not eof:
+        chunk = file.read(read_size)
+        eof = not chunk
+        offset += position
+        buffer, position = buffer[position:] + chunk, 0
+        while True:
+            position = skip_whitespace(buffer, position)
+            if position == len(buffer):
+                break
+            if finished:
+                raise CommandError(
+                    f'Лишние данные после массива JSON, позиция '
+                    f'{offset + position}')
+            if not started:
+                if buffer[position] != '[':
+                    raise CommandError('Файл JSON должен содержать массив')
+                started = empty = True
+                position += 1
+                continue
+            if empty and buffer[position] == ']':
+                finished = True
+                position += 1
+                continue
+            try:
+                item, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                if eof:
+                    raise CommandError(
+                        f'Ошибка в JSON, позиция {offset + error.pos}: '
+                        f'{error.msg}')
+                break
+            delimiter = skip_whitespace(buffer, end)
+            if delimiter == len(buffer) or buffer[delimiter] not in ',]':
+                if eof and delimiter < len(buffer):
+                    raise CommandError(
+                        f'Ошибка в JSON, позиция {offset + delimiter}: '
+                        f'ожидались «,» или «]»')
+                break
+            yield item
+            empty = False
+            finished = buffer[delimiter] == ']'
+            position = delimiter + 1
+    if not finished:
+        raise CommandError('Файл JSON оборвался до конца массива')
+
+
+def read_json(file):
+    ingredients = iter_json_array(
+        file, IngredientConstants.IMPORT_READ_SIZE.value)
+    for number, ingredient in enumerate(ingredients, 1):
+        try:
+            name = ingredient['name']
+            measurement_unit = ingredient['measurement_unit']
+        except (KeyError, TypeError):
+            raise CommandError(
+                f'Элемент {number}: ожидался объект с полями name и '
+                f'measurement_unit')
+        yield name, measurement_unit
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
 class Command(BaseCommand):
     help = 'Выгружаем ингредиенты в БД'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv'),
+            help='Путь к файлу ingredients.csv или ingredients.json.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            default=IngredientConstants.IMPORT_BATCH_SIZE.value
+        )
+
     def handle(self, *args, **options):
-        file_path = os.path.join(settings.BASE_DIR, 'data', 'ingredients.csv')
+        reader = READERS.get(os.path.splitext(options['path'])[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы .csv и .json')
 
-        ingredients_to_create = []
+        with open(options['path'], 'r', encoding='utf-8') as file, \
+                transaction.atomic():
+            rows = batches(reader(file), options['batch_size'])
+            if connection.vendor == 'postgresql':
+                total, inserted = self.copy_ingredients(rows)
+            else:
+                total, inserted = self.bulk_create_ingredients(rows)
+            bump_catalog_version()
 
-        with open(file_path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            for row in reader:
-                name, measurement_unit = row
-                ingredient, created = Ingredient.objects.get_or_create(
-                    name=name, measurement_unit=measurement_unit
-                )
-                if created:
-                    ingredients_to_create.append(ingredient)
+        self.stdout.write(self.style.SUCCESS(
+            f'Ингредиенты успешно добавлены в БД: добавлено {inserted}, '
+            f'пропущено {total - inserted}'
+        ))
 
-        Ingredient.objects.bulk_create(ingredients_to_create)
+    def bulk_create_ingredients(self, batches):
+        total = 0
+        count_before = Ingredient.objects.count()
+        for batch in batches:
+            total += len(batch)
+            Ingredient.objects.bulk_create(
+                [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in batch
+                ],
+                ignore_conflicts=True
+            )
+        return total, Ingredient.objects.count() - count_before
 
-        self.stdout.write(
-            self.style.SUCCESS('Ингредиенты успешно добавлены в БД'))
+    def copy_ingredients(self, batches):
+        total = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMPORARY TABLE ingredient_import '
+                '(name text, measurement_unit text) ON COMMIT DROP'
+            )
+            for batch in batches:
+                total += len(batch)
+                buffer = StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    'COPY ingredient_import (name, measurement_unit) '
+                    'FROM STDIN WITH (FORMAT csv)',
+                    buffer
+                )
+            cursor.execute(
+                f'INSERT INTO {Ingredient._meta.db_table} '
+                f'(name, measurement_unit) '
+                f'SELECT DISTINCT name, measurement_unit '
+                f'FROM ingredient_import '
+                f'ON CONFLICT ON CONSTRAINT unique_name_measurement_unit '
+                f'DO NOTHING'
+            )
+            return total, cursor.rowcount
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.search import update_search_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраиваем полнотекстовый индекс рецептов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            update_search_index()
+        self.stdout.write(self.style.SUCCESS('Поисковый индекс перестроен'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.counters import recount_counters
+
+
+class Command(BaseCommand):
+    help = 'Пересчитываем счётчики избранного, покупок, рецептов и подписчиков'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recount_counters()
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+INDEX_NAME = 'recipes_ingredient_name_upper_idx'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} ON recipes_ingredient '
+            f'(UPPER("name"::text) text_pattern_ops)'
+        )
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_auto_20231219_2232'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
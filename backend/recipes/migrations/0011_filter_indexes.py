@@ -0,0 +1,64 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:57
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    ('Favorite', 'favorites_count'),
+    ('ShoppingCart', 'shopping_cart_count'),
+)
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField()
+        ),
+        0
+    )
+
+
+def remove_duplicates(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for model_name, counter_field in COUNTERS:
+        model = apps.get_model('recipes', model_name)
+        keep_ids = model.objects.order_by().values(
+            'user', 'recipe'
+        ).annotate(keep_id=Min('id')).values_list('keep_id', flat=True)
+        duplicates = model.objects.exclude(id__in=list(keep_ids))
+        recipe_ids = set(duplicates.values_list('recipe_id', flat=True))
+        duplicates.delete()
+        # 0010 заполнила счётчики с учётом дубликатов.
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            **{counter_field: count_subquery(model, 'recipe')})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            'DROP INDEX recipe_tags_tag_recipe_idx'
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='favorite',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_favorite_user_recipe'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcart',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shoppingcart_user_recipe'),
+        ),
+    ]
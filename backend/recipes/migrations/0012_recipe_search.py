@@ -0,0 +1,63 @@
+from django.db import migrations
+
+INGREDIENT_NAMES_SQL = '''
+    SELECT {aggregate}
+    FROM recipes_recipeingredient AS item
+    INNER JOIN recipes_ingredient AS ingredient
+        ON ingredient.id = item.ingredient_id
+    WHERE item.recipe_id = recipe.id
+'''
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector')
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx ON recipes_recipe '
+            'USING GIN (search_vector)'
+        )
+        schema_editor.execute(f'''
+            UPDATE recipes_recipe AS recipe SET search_vector =
+                setweight(to_tsvector('russian', recipe.name), 'A')
+                || setweight(to_tsvector('russian', coalesce((
+                    {INGREDIENT_NAMES_SQL.format(
+                        aggregate="string_agg(ingredient.name, ' ')")}
+                ), '')), 'B')
+                || setweight(to_tsvector('russian', recipe.text), 'C')
+        ''')
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            'CREATE VIRTUAL TABLE recipes_recipe_search USING fts5('
+            'name, ingredients, text, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(f'''
+            INSERT INTO recipes_recipe_search (rowid, name, ingredients, text)
+            SELECT recipe.id, recipe.name, coalesce((
+                {INGREDIENT_NAMES_SQL.format(
+                    aggregate="group_concat(ingredient.name, ' ')")}
+            ), ''), recipe.text
+            FROM recipes_recipe AS recipe
+        ''')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe DROP COLUMN IF EXISTS search_vector')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS recipes_recipe_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
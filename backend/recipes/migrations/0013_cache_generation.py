@@ -0,0 +1,35 @@
+# Generated by Django 3.2.3 on 2026-10-18 06:41
+
+from time import time_ns
+
+from django.db import migrations, models
+
+
+def create_generations(apps, schema_editor):
+    CacheGeneration = apps.get_model('recipes', 'CacheGeneration')
+    CacheGeneration.objects.bulk_create([
+        CacheGeneration(name=name, value=time_ns())
+        for name in ('catalog', 'recipes')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CacheGeneration',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False, verbose_name='Название')),
+                ('value', models.BigIntegerField(verbose_name='Поколение')),
+            ],
+            options={
+                'verbose_name': 'Поколение кэша',
+                'verbose_name_plural': 'Поколения кэша',
+            },
+        ),
+        migrations.RunPython(create_generations, migrations.RunPython.noop),
+    ]
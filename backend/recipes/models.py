@@ -2,9 +2,12 @@ from colorfield.fields import ColorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
+from users.mixins import (AtomicSaveMixin, CounterFieldsMixin,
+                          RelationDeleteMixin, RelationQuerySet)
 from users.models import User
 
-from .constants import IngredientConstants, RecipesConstants, TagsConstants
+from .constants import (CatalogConstants, IngredientConstants,
+                        RecipesConstants, TagsConstants)
 
 
 class Tag(models.Model):
@@ -62,7 +65,7 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class Recipe(AtomicSaveMixin, CounterFieldsMixin, models.Model):
     author = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='recipes',
@@ -78,6 +81,10 @@ class Recipe(models.Model):
         verbose_name='Изображение', upload_to='recipes/images/'
     )
 
+    image_variants = models.JSONField(
+        'Уменьшенные копии изображения', default=dict, editable=False
+    )
+
     text = models.TextField('Описание')
 
     ingredients = models.ManyToManyField(
@@ -101,10 +108,25 @@ class Recipe(models.Model):
             ))],
     )
 
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное', default=0, editable=False
+    )
+
+    shopping_cart_count = models.PositiveIntegerField(
+        'Добавлений в список покупок', default=0, editable=False
+    )
+
+    counter_fields = ('favorites_count', 'shopping_cart_count')
+
     class Meta:
         ordering = ['-id']
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = [
+            models.Index(
+                fields=['author', '-id'], name='recipe_author_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -148,7 +170,8 @@ class RecipeIngredient(models.Model):
         )
 
 
-class FavoriteShoppingCart(models.Model):
+class FavoriteShoppingCart(AtomicSaveMixin, RelationDeleteMixin,
+                           models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE
     )
@@ -156,13 +179,23 @@ class FavoriteShoppingCart(models.Model):
         Recipe, on_delete=models.CASCADE
     )
 
+    objects = RelationQuerySet.as_manager()
+
+    target_field = 'recipe'
+
     class Meta:
         abstract = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_%(class)s_user_recipe'
+            )
+        ]
 
 
 class ShoppingCart(FavoriteShoppingCart):
 
-    class Meta:
+    class Meta(FavoriteShoppingCart.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shopping_cart'
@@ -173,10 +206,25 @@ class ShoppingCart(FavoriteShoppingCart):
 
 class Favorite(FavoriteShoppingCart):
 
-    class Meta:
+    class Meta(FavoriteShoppingCart.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
         default_related_name = 'favorite'
 
     def __str__(self):
         return f'Рецепт {self.recipe.name} добавлен в Избранное'
+
+
+class CacheGeneration(models.Model):
+    name = models.CharField(
+        'Название', primary_key=True,
+        max_length=CatalogConstants.GENERATION_NAME_MAX_LENGTH.value
+    )
+    value = models.BigIntegerField('Поколение')
+
+    class Meta:
+        verbose_name = 'Поколение кэша'
+        verbose_name_plural = 'Поколения кэша'
+
+    def __str__(self):
+        return f'{self.name}: {self.value}'
@@ -0,0 +1,107 @@
+import re
+
+from django.db import connection
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+SEARCH_TABLE = 'recipes_recipe_search'
+
+INGREDIENT_NAMES_SQL = '''
+    SELECT {aggregate}
+    FROM recipes_recipeingredient AS item
+    INNER JOIN recipes_ingredient AS ingredient
+        ON ingredient.id = item.ingredient_id
+    WHERE item.recipe_id = recipe.id
+'''
+
+POSTGRESQL_UPDATE_SQL = f'''
+    UPDATE recipes_recipe AS recipe SET search_vector =
+        setweight(to_tsvector('{SEARCH_CONFIG}', recipe.name), 'A')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', coalesce((
+            {INGREDIENT_NAMES_SQL.format(
+                aggregate="string_agg(ingredient.name, ' ')")}
+        ), '')), 'B')
+        || setweight(to_tsvector('{SEARCH_CONFIG}', recipe.text), 'C')
+'''
+POSTGRESQL_MATCH_SQL = (
+    f"SELECT id FROM recipes_recipe "
+    f"WHERE search_vector @@ websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+)
+POSTGRESQL_RANK_SQL = (
+    f"ts_rank(recipes_recipe.search_vector, "
+    f"websearch_to_tsquery('{SEARCH_CONFIG}', %s))"
+)
+
+SQLITE_DELETE_SQL = f'DELETE FROM {SEARCH_TABLE}'
+SQLITE_INSERT_SQL = f'''
+    INSERT INTO {SEARCH_TABLE} (rowid, name, ingredients, text)
+    SELECT recipe.id, recipe.name, coalesce((
+        {INGREDIENT_NAMES_SQL.format(
+            aggregate="group_concat(ingredient.name, ' ')")}
+    ), ''), recipe.text
+    FROM recipes_recipe AS recipe
+'''
+SQLITE_MATCH_SQL = (
+    f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+)
+# Вес колонок name, ingredients, text. bm25 тем меньше, чем лучше
+# совпадение, поэтому знак меняем, чтобы ранг рос вместе с релевантностью.
+SQLITE_RANK_SQL = (
+    f'(SELECT -bm25({SEARCH_TABLE}, 10.0, 5.0, 1.0) FROM {SEARCH_TABLE} '
+    f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = recipes_recipe.id)'
+)
+
+
+def _id_condition(column, recipe_ids):
+    if recipe_ids is None:
+        return '', []
+    recipe_ids = list(recipe_ids)
+    return (
+        f' WHERE {column} IN ({", ".join(["%s"] * len(recipe_ids))})',
+        recipe_ids
+    )
+
+
+def update_search_index(recipe_ids=None):
+    if recipe_ids is not None and not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            condition, params = _id_condition('recipe.id', recipe_ids)
+            cursor.execute(POSTGRESQL_UPDATE_SQL + condition, params)
+        elif connection.vendor == 'sqlite':
+            condition, params = _id_condition('rowid', recipe_ids)
+            cursor.execute(SQLITE_DELETE_SQL + condition, params)
+            condition, params = _id_condition('recipe.id', recipe_ids)
+            cursor.execute(SQLITE_INSERT_SQL + condition, params)
+
+
+def remove_from_search_index(recipe_ids):
+    # В PostgreSQL поисковый вектор хранится в самой строке рецепта и
+    # удаляется вместе с ней.
+    if connection.vendor == 'sqlite':
+        condition, params = _id_condition('rowid', recipe_ids)
+        with connection.cursor() as cursor:
+            cursor.execute(SQLITE_DELETE_SQL + condition, params)
+
+
+def _sqlite_query(query):
+    # FTS5 не умеет стемминг для русского языка, поэтому каждое слово
+    # ищем по префиксу: «томат» найдёт и «томаты», и «томатный».
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', query))
+
+
+def search_recipes(queryset, query):
+    if connection.vendor == 'postgresql':
+        match_sql, rank_sql = POSTGRESQL_MATCH_SQL, POSTGRESQL_RANK_SQL
+    else:
+        match_sql, rank_sql = SQLITE_MATCH_SQL, SQLITE_RANK_SQL
+        query = _sqlite_query(query)
+        if not query:
+            return queryset.none()
+    return queryset.filter(id__in=RawSQL(match_sql, [query])).annotate(
+        # Без output_field позиция курсора сравнивается с рангом как
+        # строка, и следующая страница повторяет первую.
+        search_rank=RawSQL(rank_sql, [query], output_field=FloatField())
+    ).order_by('-search_rank', '-id')
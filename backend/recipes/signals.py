@@ -0,0 +1,136 @@
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from users.mixins import relations_deleted
+from users.models import Subscriptions, User
+
+from .catalog import bump_catalog_version, bump_recipes_generation_on_commit
+from .counters import increment, recount
+from .images import schedule_image_variants
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, Tag)
+from .search import remove_from_search_index, update_search_index
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def catalog_changed(sender, **kwargs):
+    bump_catalog_version()
+
+
+AUTHOR_FIELDS = frozenset(('email', 'username', 'first_name', 'last_name'))
+
+# Пользователи, которые сейчас удаляются вместе с рецептами: их счётчик
+# рецептов не обновляем, а рецепты убираем из поиска одним запросом.
+deleting_authors = ContextVar('deleting_authors', default=frozenset())
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def recipes_changed(sender, action='post_save', **kwargs):
+    if action.startswith('post_'):
+        bump_recipes_generation_on_commit()
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, update_fields, **kwargs):
+    if update_fields is None or AUTHOR_FIELDS & set(update_fields):
+        bump_recipes_generation_on_commit()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_saved(sender, instance, created, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: update_search_index(list(
+            instance.recipes_ingredients.values_list('recipe_id', flat=True)
+        )))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    if created:
+        increment(User, instance.author_id, 'recipes_count', 1)
+    transaction.on_commit(lambda: update_search_index([instance.id]))
+    transaction.on_commit(lambda: schedule_image_variants(instance))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    if instance.author_id in deleting_authors.get():
+        return
+    increment(User, instance.author_id, 'recipes_count', -1)
+    remove_from_search_index([instance.id])
+
+
+RELATION_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'shopping_cart_count',
+}
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def recipe_relation_created(sender, instance, created, **kwargs):
+    if created:
+        increment(Recipe, instance.recipe_id, RELATION_COUNTERS[sender], 1)
+
+
+@receiver(relations_deleted, sender=Favorite)
+@receiver(relations_deleted, sender=ShoppingCart)
+def recipe_relations_deleted(sender, target_ids, **kwargs):
+    recount(
+        Recipe.objects.filter(id__in=target_ids), RELATION_COUNTERS[sender])
+
+
+@receiver(post_save, sender=Subscriptions)
+def subscription_created(sender, instance, created, **kwargs):
+    if created:
+        increment(User, instance.author_id, 'subscribers_count', 1)
+
+
+@receiver(relations_deleted, sender=Subscriptions)
+def subscriptions_deleted(sender, target_ids, **kwargs):
+    recount(User.objects.filter(id__in=target_ids), 'subscribers_count')
+
+
+# Избранное, список покупок и подписки пользователя удаляются каскадом без
+# сигналов, поэтому заранее запоминаем, чьи счётчики пересчитать.
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    deleting_authors.set(deleting_authors.get() | {instance.id})
+    instance.deleted_recipe_ids = list(Recipe.objects.filter(
+        author=instance).values_list('id', flat=True))
+    instance.related_counter_ids = (
+        list(Favorite.objects.filter(user=instance).values_list(
+            'recipe_id', flat=True
+        ).union(ShoppingCart.objects.filter(user=instance).values_list(
+            'recipe_id', flat=True
+        ))),
+        list(Subscriptions.objects.filter(user=instance).values_list(
+            'author_id', flat=True))
+    )
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    deleting_authors.set(deleting_authors.get() - {instance.id})
+    if instance.deleted_recipe_ids:
+        remove_from_search_index(instance.deleted_recipe_ids)
+    recipe_ids, author_ids = instance.related_counter_ids
+    if recipe_ids:
+        recount(Recipe.objects.filter(id__in=recipe_ids))
+    if author_ids:
+        recount(User.objects.filter(id__in=author_ids), 'subscribers_count')
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='subscriptions',
+            index=models.Index(fields=['author', 'user'], name='subscription_author_user_idx'),
+        ),
+    ]
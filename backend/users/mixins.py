@@ -0,0 +1,59 @@
+from django.db import models, transaction
+from django.dispatch import Signal
+
+# Отправляется одним вызовом на всё удаление связей (избранное, список
+# покупок, подписки). Обработчики post_delete отключили бы быстрое
+# удаление, и каскад от рецепта или пользователя выполнял бы отдельные
+# запросы на каждую связь. При каскаде сигнал не отправляется.
+relations_deleted = Signal()
+
+
+def send_relations_deleted(model, rows):
+    if rows:
+        relations_deleted.send(
+            sender=model,
+            user_ids={user_id for user_id, _ in rows},
+            target_ids={target_id for _, target_id in rows}
+        )
+
+
+class RelationQuerySet(models.QuerySet):
+
+    def delete(self):
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = list(self.values_list(
+                'user_id', f'{self.model.target_field}_id'))
+            result = super().delete()
+            send_relations_deleted(self.model, rows)
+        return result
+
+
+class AtomicSaveMixin:
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+class RelationDeleteMixin:
+    target_field = None
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            result = super().delete(*args, **kwargs)
+            send_relations_deleted(type(self), [(
+                self.user_id, getattr(self, f'{self.target_field}_id'))])
+        return result
+
+
+class CounterFieldsMixin:
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
@@ -4,9 +4,11 @@ from django.db import models
 from django.db.models import F, Q
 
 from .constants import UserConstants
+from .mixins import (AtomicSaveMixin, CounterFieldsMixin, RelationDeleteMixin,
+                     RelationQuerySet)
 
 
-class User(AbstractUser):
+class User(CounterFieldsMixin, AbstractUser):
     username_validator = UnicodeUsernameValidator()
 
     username = models.CharField(
@@ -29,6 +31,15 @@ class User(AbstractUser):
         'Фамилия', max_length=UserConstants.PERSONAL_DATA_MAX_LENGTH.value
     )
 
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов', default=0, editable=False
+    )
+    subscribers_count = models.PositiveIntegerField(
+        'Количество подписчиков', default=0, editable=False
+    )
+
+    counter_fields = ('recipes_count', 'subscribers_count')
+
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
@@ -40,7 +51,7 @@ class User(AbstractUser):
         return self.username
 
 
-class Subscriptions(models.Model):
+class Subscriptions(AtomicSaveMixin, RelationDeleteMixin, models.Model):
     user = models.ForeignKey(
         User, on_delete=models.CASCADE,
         related_name='subscriber',
@@ -53,6 +64,10 @@ class Subscriptions(models.Model):
         verbose_name='Автор'
     )
 
+    objects = RelationQuerySet.as_manager()
+
+    target_field = 'author'
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
@@ -62,6 +77,11 @@ class Subscriptions(models.Model):
             models.CheckConstraint(check=~Q(user=F('author')),
                                    name='no_autosubscribe')
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='subscription_author_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'